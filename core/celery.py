@@ -1,7 +1,17 @@
-from celery import Celery
+import time
+
+from bson import json_util
+from celery import Celery, Task
 from celery.beat import crontab
+from pymongo import ASCENDING
 
 from . import celeryconfig
+from .config import (
+    MAINTENANCE_BATCH_SIZE,
+    MAINTENANCE_PAUSE,
+    sync_db,
+    sync_redis_client,
+)
 
 app = Celery(
     "market", broker="redis://localhost:6379/0", backend="redis://localhost:6379/0"
@@ -16,3 +26,72 @@ app.conf.beat_schedule = {
         "schedule": crontab(30, 3, 1),
     }
 }
+
+
+class MaintenanceJob(Task):
+    # базовий клас задач обслуговування: документи обробляються пачками за
+    # зростанням _id, позиція після кожної пачки зберігається в Redis, тому
+    # перерваний запуск продовжується з місця зупинки
+    checkpoint_ttl = 7 * 24 * 60 * 60
+
+    @property
+    def checkpoint_key(self) -> str:
+        return f"maintenance:{self.name}:checkpoint"
+
+    def run_in_batches(
+        self,
+        collection_name: str,
+        query: dict,
+        operation,
+        projection: dict = None,
+        batch_size: int = None,
+        pause: float = None,
+        on_batch=None,
+    ) -> dict:
+        batch_size = batch_size or MAINTENANCE_BATCH_SIZE
+        pause = MAINTENANCE_PAUSE if pause is None else pause
+        collection = sync_db[collection_name]
+
+        saved = sync_redis_client.get(self.checkpoint_key)
+        last_id = json_util.loads(saved) if saved else None
+        processed = modified = 0
+
+        while True:
+            f = query
+            if last_id is not None:
+                f = {"$and": [query, {"_id": {"$gt": last_id}}]}
+
+            documents = list(
+                collection.find(f, projection).sort("_id", ASCENDING).limit(batch_size)
+            )
+            if not documents:
+                break
+
+            result = collection.bulk_write(
+                [operation(document) for document in documents], ordered=False
+            )
+            if on_batch is not None:
+                on_batch(documents)
+
+            processed += len(documents)
+            modified += result.modified_count
+            last_id = documents[-1]["_id"]
+
+            sync_redis_client.set(
+                self.checkpoint_key, json_util.dumps(last_id), ex=self.checkpoint_ttl
+            )
+            self.report(processed=processed, modified=modified, last_id=str(last_id))
+
+            if len(documents) < batch_size:
+                break
+
+            # пауза між пачками, щоб не конкурувати з запитами вітрини
+            time.sleep(pause)
+
+        sync_redis_client.delete(self.checkpoint_key)
+        return {"processed": processed, "modified": modified}
+
+    def report(self, **meta):
+        # стан PROGRESS видно через AsyncResult(task_id).info
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta=meta)
@@ -2,13 +2,29 @@ import os
 
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
-from redis import Redis
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, MongoClient
+from redis import Redis as SyncRedis
+from redis.asyncio import BlockingConnectionPool, Redis
 
 load_dotenv()
 client = AsyncIOMotorClient()
-redis_client = Redis()
+# синхронний клієнт для celery задач, з'єднується при першому запиті
+sync_client = MongoClient(connect=False)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", 200))
+REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", 5))
+
+# один пул з'єднань на весь процес, корутини чекають вільне з'єднання
+redis_pool = BlockingConnectionPool.from_url(
+    REDIS_URL, max_connections=REDIS_POOL_SIZE, timeout=REDIS_POOL_TIMEOUT
+)
+redis_client = Redis(connection_pool=redis_pool)
+# синхронний клієнт для celery задач
+sync_redis_client = SyncRedis.from_url(REDIS_URL)
 
 db = client["marketplace"]
+sync_db = sync_client["marketplace"]
 
 
 products = db["products"]
@@ -17,15 +33,111 @@ orderds = db["orders"]
 categories = db["categories"]
 users = db["users"]
 
+# кожен порядок сортування товарів закінчується на _id, щоб ключ курсора був
+# унікальним; індекси нижче будуються з цих же ключів
+PRODUCT_SORT_ORDERS = {
+    "newest": [("created_at", DESCENDING), ("_id", DESCENDING)],
+    "price": [("price.retail", ASCENDING), ("_id", ASCENDING)],
+    "rating": [("rating", DESCENDING), ("_id", DESCENDING)],
+}
+# поле рівності перед ключем сортування; tags і category_ids.title - масиви,
+# тому в одному індексі бути не можуть
+PRODUCT_INDEX_LEADS = {"tags": "tags", "category": "category_ids.title"}
+# діапазон ціни перед ключем сортування означав би сортування в пам'яті, тому
+# для фільтра лише за ціною вона йде після ключа і відсікає ключі індексу
+# до читання документів (products_newest_price, products_rating_price)
+PRODUCT_PRICE_FIELD = "price.retail"
+
+# реєстр індексів для всіх колекцій, застосовується під час старту
+# (ENSURE_INDEXES) або через `python -m core.indexes apply|report`
+INDEXES = {
+    "products": [
+        IndexModel("slug", name="products_slug", unique=True),
+        *(
+            IndexModel(keys, name=f"products_{sort}")
+            for sort, keys in PRODUCT_SORT_ORDERS.items()
+        ),
+        *(
+            IndexModel([(field, ASCENDING), *keys], name=f"products_{lead}_{sort}")
+            for lead, field in PRODUCT_INDEX_LEADS.items()
+            for sort, keys in PRODUCT_SORT_ORDERS.items()
+        ),
+        *(
+            IndexModel(
+                [*keys, (PRODUCT_PRICE_FIELD, ASCENDING)], name=f"products_{sort}_price"
+            )
+            for sort, keys in PRODUCT_SORT_ORDERS.items()
+            if keys[0][0] != PRODUCT_PRICE_FIELD
+        ),
+        IndexModel(
+            [("search.title", TEXT), ("search.text", TEXT)],
+            name="products_search",
+            weights={"search.title": 10, "search.text": 2},
+            default_language="none",
+            language_override="search_language",
+        ),
+    ],
+    "comments": [
+        IndexModel(
+            [("product", ASCENDING), ("moderate", ASCENDING)], name="comments_product"
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("moderate", ASCENDING)], name="comments_user"
+        ),
+        IndexModel(
+            [
+                ("moderate", ASCENDING),
+                ("created_at", ASCENDING),
+                ("lease_until", ASCENDING),
+            ],
+            name="comments_moderation",
+        ),
+    ],
+    "orders": [
+        IndexModel([("created_date", DESCENDING)], name="orders_created_date"),
+        IndexModel(
+            [("user_id", ASCENDING), ("created_date", DESCENDING), ("_id", DESCENDING)],
+            name="orders_user_history",
+        ),
+    ],
+    "categories": [
+        IndexModel("title", name="categories_title", unique=True),
+    ],
+    "users": [
+        IndexModel("email", name="users_email", unique=True),
+    ],
+}
+
 
 class RedisTools:
-    __REDIS = Redis()
+    __REDIS = redis_client
 
     @property
     def connect_redis(self):
         return self.__REDIS
 
 
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "1") == "1"
+RUN_BACKFILLS = os.getenv("RUN_BACKFILLS", "1") == "1"
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", 300))
+FACETS_CACHE_TTL = int(os.getenv("FACETS_CACHE_TTL", 600))
+COMMENT_LEASE_SECONDS = int(os.getenv("COMMENT_LEASE_SECONDS", 300))
+LEADERBOARD_SCAN_ROUNDS = int(os.getenv("LEADERBOARD_SCAN_ROUNDS", 5))
+SLUG_INDEX_CHECK_INTERVAL = float(os.getenv("SLUG_INDEX_CHECK_INTERVAL", 5))
+CATEGORY_CHECK_INTERVAL = float(os.getenv("CATEGORY_CHECK_INTERVAL", 5))
+CATEGORY_CACHE_TTL = float(os.getenv("CATEGORY_CACHE_TTL", 600))
+
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", 500))
+MAINTENANCE_PAUSE = float(os.getenv("MAINTENANCE_PAUSE", 0.2))
+
 PUBLIC_KEY = os.getenv("PUBLIC_KEY")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY")
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", os.cpu_count() or 1))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 100))
+
+LIQPAY_HOST = os.getenv("LIQPAY_HOST", "https://www.liqpay.ua/api/")
+LIQPAY_TIMEOUT = float(os.getenv("LIQPAY_TIMEOUT", 10))
+LIQPAY_POOL_SIZE = int(os.getenv("LIQPAY_POOL_SIZE", 100))
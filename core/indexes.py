@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import json
+
+from pymongo.errors import OperationFailure
+
+from .config import INDEXES, db
+
+
+async def ensure_indexes() -> dict:
+    # create_index ідемпотентний, існуючі індекси з тими ж параметрами пропускаються
+    result = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        result[collection_name] = {"applied": [], "failed": {}}
+
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await collection.create_indexes([index])
+                result[collection_name]["applied"].append(name)
+            except OperationFailure as error:
+                result[collection_name]["failed"][name] = str(error)
+
+    return result
+
+
+async def report_indexes() -> dict:
+    result = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        registered = {index.document["name"] for index in indexes}
+        existing = set(await collection.index_information())
+
+        usage = {}
+        async for stats in collection.aggregate([{"$indexStats": {}}]):
+            usage[stats["name"]] = stats["accesses"]["ops"]
+
+        result[collection_name] = {
+            "missing": sorted(registered - existing),
+            "unused": sorted(
+                name for name, ops in usage.items() if ops == 0 and name != "_id_"
+            ),
+            "unregistered": sorted(existing - registered - {"_id_"}),
+        }
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MongoDB index registry")
+    parser.add_argument("command", choices=["apply", "report"])
+    args = parser.parse_args()
+
+    command = ensure_indexes if args.command == "apply" else report_indexes
+    print(json.dumps(asyncio.run(command()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 LiqPay Python SDK
 ~~~~~~~~~~~~~~~~~
 supports python 3 version
-requires requests module
+requires httpx module
 """
 
 __title__ = "LiqPay Python SDK"
@@ -14,10 +14,20 @@ import json
 from copy import deepcopy
 from urllib.parse import urljoin
 
-import requests
+import httpx
 
 from . import config
 
+# спільний клієнт з пулом keep-alive з'єднань до LiqPay
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=config.LIQPAY_POOL_SIZE,
+        max_keepalive_connections=config.LIQPAY_POOL_SIZE,
+    ),
+    timeout=config.LIQPAY_TIMEOUT,
+    follow_redirects=True,
+)
+
 
 class ParamValidationError(Exception):
     pass
@@ -54,10 +64,11 @@ class LiqPay(object):
         "action",
     ]
 
-    def __init__(self, public_key, private_key, host="https://www.liqpay.ua/api/"):
+    def __init__(self, public_key, private_key, host=None, client=None):
         self._public_key = public_key
         self._private_key = private_key
-        self._host = host
+        self._host = host or config.LIQPAY_HOST
+        self._client = client or http_client
 
     def _make_signature(self, private_key, data):
         str_to_sign = private_key + data + private_key
@@ -70,9 +81,15 @@ class LiqPay(object):
         params.update(public_key=self._public_key)
         return params
 
-    def api(self, url, params=None):
+    async def post(self, url, data, timeout=None):
+        return await self._client.post(
+            urljoin(self._host, url),
+            data=data,
+            timeout=timeout or config.LIQPAY_TIMEOUT,
+        )
+
+    async def api(self, url, params=None, timeout=None):
         params = self._prepare_params(params)
-        print(params)
         params_validator = (
             ("version", lambda x: x is not None),
             ("action", lambda x: x is not None),
@@ -84,9 +101,8 @@ class LiqPay(object):
 
         encoded_data, signature = self.get_data_end_signature("api", params)
 
-        request_url = urljoin(self._host, url)
         request_data = {"data": encoded_data, "signature": signature}
-        response = requests.post(request_url, data=request_data, verify=True)
+        response = await self.post(url, request_data, timeout)
         return json.loads(response.content.decode("utf-8"))
 
     def cnb_form(self, params):
@@ -181,10 +197,10 @@ class LiqPayTools:
     __PUBLIC_KEY = config.PUBLIC_KEY
     __PRIVATE_KEY = config.PRIVATE_KEY
 
-    def __init__(self):
-        self.liqpay = LiqPay(self.__PUBLIC_KEY, self.__PRIVATE_KEY)
+    def __init__(self, client=None):
+        self.liqpay = LiqPay(self.__PUBLIC_KEY, self.__PRIVATE_KEY, client=client)
 
-    def generate_pay_link(self, order_data):
+    async def generate_pay_link(self, order_data, timeout=None):
 
         description = f"Order by {order_data['recipient_data']['user']['first_name']} {order_data['recipient_data']['user']['first_name']}"
         # Дані для відправки на LiqPay
@@ -205,17 +221,15 @@ class LiqPayTools:
 
         params = {"data": data_to_sign, "signature": self.liqpay.cnb_signature(data)}
         try:
-            response = requests.post(
-                url="https://www.liqpay.ua/api/3/checkout/", data=params
-            )
+            response = await self.liqpay.post("3/checkout/", params, timeout)
             if response.status_code == 200:
-                return response.url
+                return str(response.url)
 
             return response.status_code
-        except:
+        except httpx.HTTPError:
             return 400
 
-    def check_pay_status(self, order_id):
+    async def check_pay_status(self, order_id, timeout=None):
 
         data = {
             "version": "3",
@@ -224,6 +238,6 @@ class LiqPayTools:
 
         data["action"] = "status"
         data["order_id"] = order_id
-        response = self.liqpay.api("request", data)
+        response = await self.liqpay.api("request", data, timeout)
 
         return response
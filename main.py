@@ -1,13 +1,41 @@
 import uuid
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 
+from core import config
+from core.config import redis_client, redis_pool
+from core.indexes import ensure_indexes
+from core.liqpay import http_client
+from src.domain.products.tasks import schedule_backfills
 from src.presentation.cart.routers import cart_router
 from src.presentation.orders.routers import order_router
 from src.presentation.products.routers import product_router
+from src.presentation.responses import BSONJSONResponse
 from src.presentation.users.routers import users_router
+from src.repositories.products.categories import category_index
+from src.repositories.products.repository import ProductRepository
+from src.repositories.products.slugs import slug_index
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.ENSURE_INDEXES:
+        await ensure_indexes()
+    await ProductRepository.refresh_indexes()
+    if config.RUN_BACKFILLS:
+        await schedule_backfills()
+    await slug_index.refresh(force=True)
+    slug_index.subscribe()
+    await category_index.refresh(force=True)
+    yield
+    await slug_index.unsubscribe()
+    await redis_client.aclose()
+    await redis_pool.disconnect()
+    await http_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=BSONJSONResponse)
 
 
 @app.middleware("http")
@@ -1,3 +1,4 @@
+from src.presentation.cart.dto import CartItemDTO
 from src.repositories.cart.repository import CartRepository
 
 
@@ -7,36 +8,58 @@ class CartDomain:
 
     async def add_to_cart(self, session_key: str, slug: str, qty: int) -> dict:
         try:
-            await self.repo.add_to_cart(session_key, slug, qty)
-            return {"ok": "add success"}
+            added = await self.repo.add_to_cart(session_key, slug, qty)
         except:
-
             return {"error": "something went wrong"}
 
+        if not added:
+            return {"error": "product not found"}
+        return {"ok": "add success"}
+
+    async def add_many_to_cart(self, session_key: str, items: list[CartItemDTO]):
+        quantities = {}
+        errors = []
+
+        for item in items:
+            if item.qty < 1:
+                errors.append({"slug": item.slug, "error": "qty must be positive"})
+                continue
+            quantities[item.slug] = quantities.get(item.slug, 0) + item.qty
+
+        added = await self.repo.add_many_to_cart(session_key, quantities)
+
+        for slug in quantities.keys() - set(added):
+            errors.append({"slug": slug, "error": "product not found"})
+
+        return {"added": added, "errors": errors}
+
     async def delete_cart(self, session_key: str, specific: str = None):
         result = await self.repo.clear_cart(session_key, specific)
         return result
 
-    async def get_cart_data(self, session_key: str) -> list:
-        cart_data = await self.repo.retrieve_cart(session_key)
+    async def get_cart(self, session_key: str) -> list | None:
+        cart_lines = await self.repo.retrieve_cart(session_key)
 
-        if cart_data is None:
-            return {"message": "cart is empty"}
+        if cart_lines is None:
+            return None
 
-        products, cart_data = (cart_data.get("products"),)
-        cart_data = cart_data.get("cart_data")
+        return self.generate_cart_data(cart_lines)
 
-        cart_data = self.generate_cart_data(products, cart_data)
+    async def get_cart_data(self, session_key: str) -> list | dict:
+        cart_data = await self.get_cart(session_key)
+
+        if cart_data is None:
+            return {"message": "cart is empty"}
 
         return cart_data
 
     @staticmethod
-    def generate_cart_data(product_list: list, cart_data: dict) -> list:
+    def generate_cart_data(cart_lines: list) -> list:
         cart_data = []
         summary_price = 0
 
-        for product in product_list:
-            qty = cart_data.get(str(product["_id"]))["qty"]
+        for product in cart_lines:
+            qty = product["qty"]
 
             # ціна за одиницю будується в залежності від кількості замовлений одиниць
             current_price = (
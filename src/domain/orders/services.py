@@ -1,18 +1,42 @@
-from datetime import datetime
+import csv
+import io
 
 from core.liqpay import LiqPayTools
 from src.domain.cart.services import CartDomain
+from src.domain.tools.common import dumps, parse_fields, utc_naive
 from src.repositories.orders.repository import OrderRepository
+from src.repositories.products.leaderboard import LeaderboardRepository
+from src.repositories.products.slugs import slug_index
+
+ORDER_FIELDS = {"status", "created_date", "total_price", "items"}
+EXPORT_CHUNK_SIZE = 200
+CSV_COLUMNS = [
+    "id",
+    "created_date",
+    "status",
+    "user_id",
+    "total_price",
+    "first_name",
+    "last_name",
+    "city",
+    "zip_code",
+    "items",
+]
 
 
 class OrderDomain(LiqPayTools):
 
     def __init__(self) -> None:
         self.repo = OrderRepository()
+        self.leaderboard = LeaderboardRepository()
         super().__init__()
 
     async def complete_order(
-        self, session_key, order_data: dict, cart: CartDomain = CartDomain()
+        self,
+        session_key,
+        order_data: dict,
+        user_id: str = None,
+        cart: CartDomain = CartDomain(),
     ):
         cart_data = await cart.get_cart(session_key)
 
@@ -20,11 +44,18 @@ class OrderDomain(LiqPayTools):
         if cart_data is None:
             return cart_data
 
+        items_line = cart_data[:-1]
+        slugs = [line["slug"] for line in items_line]
+        product_ids = await slug_index.resolve_many(slugs)
+        for line in items_line:
+            line["product_id"] = product_ids.get(line["slug"])
+
         # створюємо екземпляр замовлення
         order = {}
-        order["items_line"] = cart_data[:-1]
+        order["items_line"] = items_line
         order["status"] = "no pay"
-        order["created_date"] = datetime.now()
+        order["user_id"] = user_id
+        order["created_date"] = utc_naive()
         order["recipient_data"] = {
             "user": {
                 "first_name": order_data.get("first_name"),
@@ -42,27 +73,88 @@ class OrderDomain(LiqPayTools):
 
         # зберігаємо замовлення
         await self.repo.create_order(order)
-        link_to_pay = self.generate_pay_link(order)
+
+        sold = {}
+        for line in items_line:
+            if line["product_id"] is not None:
+                product_id = str(line["product_id"])
+                sold[product_id] = sold.get(product_id, 0) + line["qty"]
+        await self.leaderboard.add_sales(sold)
+
+        link_to_pay = await self.generate_pay_link(order)
         return link_to_pay
 
-    def verify_payment(self, order_id):
-        status = self.check_pay_status(order_id)
+    async def verify_payment(self, order_id):
+        status = await self.check_pay_status(order_id)
 
         return status
 
-    async def fetch_orders(self):
-        list_of_orders = await self.repo.retrieve_all_orders()
-
-        # Отримати рядкове представлення ObjectId для кожного документа
-        list_of_orders_with_string_ids = [
-            {**order, "_id": str(order["_id"])} for order in list_of_orders
-        ]
+    async def fetch_orders(
+        self, user_id: str, limit: int, cursor: str = None, fields: str = None
+    ):
+        fields = parse_fields(fields, ORDER_FIELDS)
+        list_of_orders, next_cursor = await self.repo.retrieve_all_orders(
+            user_id, limit, cursor, fields
+        )
 
-        return list_of_orders_with_string_ids
+        return {"orders": list_of_orders, "next": next_cursor}
 
     async def fetch_one_order(self, order_id):
-        order = await self.repo.retrieve_order(order_id)
-
-        order["_id"] = str(order.pop("_id"))
-
-        return order
+        return await self.repo.retrieve_order(order_id)
+
+    async def export_orders(self, file_format: str, date_from=None, date_to=None):
+        date_from = date_from and utc_naive(date_from)
+        date_to = date_to and utc_naive(date_to)
+
+        if file_format == "csv":
+            chunks = self.__export_csv(date_from, date_to)
+        else:
+            chunks = self.__export_ndjson(date_from, date_to)
+
+        async for chunk in chunks:
+            yield chunk
+
+    async def __export_ndjson(self, date_from, date_to):
+        lines = []
+        async for order in self.repo.stream_orders(date_from, date_to):
+            lines.append(dumps(order) + b"\n")
+
+            if len(lines) == EXPORT_CHUNK_SIZE:
+                yield b"".join(lines)
+                lines = []
+
+        if lines:
+            yield b"".join(lines)
+
+    async def __export_csv(self, date_from, date_to):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        rows = 0
+
+        async for order in self.repo.stream_orders(date_from, date_to):
+            recipient = order.get("recipient_data", {})
+            writer.writerow(
+                [
+                    str(order["_id"]),
+                    order["created_date"].isoformat(),
+                    order.get("status"),
+                    order.get("user_id"),
+                    order.get("total_price"),
+                    recipient.get("user", {}).get("first_name"),
+                    recipient.get("user", {}).get("last_name"),
+                    recipient.get("address", {}).get("city"),
+                    recipient.get("address", {}).get("zip_code"),
+                    len(order.get("items_line", [])),
+                ]
+            )
+            rows += 1
+
+            if rows == EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
@@ -1,5 +1,8 @@
+from src.domain.tools.common import parse_fields
 from src.repositories.tools.redistools import RedisRepository
 
+from .services import PRODUCT_FIELDS
+
 
 class BookmarkDomain:
     def __init__(self) -> None:
@@ -9,5 +12,6 @@ class BookmarkDomain:
 
         return await self.repo.update_bookmark(session_key, product_slug)
 
-    async def bookmarks_list(self, session_key: str) -> list:
-        return await self.repo.get_bookmarks(session_key)
+    async def bookmarks_list(self, session_key: str, fields: str = None) -> list:
+        fields = parse_fields(fields, PRODUCT_FIELDS)
+        return await self.repo.get_bookmarks(session_key, fields)
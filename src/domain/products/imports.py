@@ -0,0 +1,120 @@
+import codecs
+import csv
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
+
+from src.domain.tools.common import clear_none
+from src.presentation.products.dto import ProductDTO
+
+IMPORT_BATCH_SIZE = 1000
+REQUIRED_FIELDS = ("title", "price", "category_titles")
+CSV_LIST_SEPARATOR = "|"
+
+product_adapter = TypeAdapter(ProductDTO)
+
+
+async def read_lines(chunks):
+    # байти з тіла запиту в рядки, символ UTF-8 може бути розірваний між чанками
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def read_ndjson(chunks):
+    number = 0
+    async for line in read_lines(chunks):
+        if not line.strip():
+            continue
+
+        number += 1
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield number, None, "invalid json"
+            continue
+
+        if not isinstance(row, dict):
+            yield number, None, "row must be an object"
+            continue
+        yield number, row, None
+
+
+async def read_csv(chunks):
+    # запис CSV може займати кілька рядків, якщо в полі в лапках є перенос;
+    # запис завершено, коли кількість лапок парна
+    header = None
+    number = 0
+    record = []
+
+    async for line in read_lines(chunks):
+        record.append(line)
+        if sum(part.count('"') for part in record) % 2:
+            continue
+
+        values = next(csv.reader(["\n".join(record)]), [])
+        record = []
+        if not any(values):
+            continue
+
+        if header is None:
+            header = [value.strip().lstrip("\ufeff") for value in values]
+            continue
+
+        number += 1
+        if len(values) != len(header):
+            yield number, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield number, csv_product(dict(zip(header, values))), None
+
+    if record:
+        yield number + 1, None, "unterminated quoted field"
+
+
+def csv_product(row: dict) -> dict:
+    row = {key: value.strip() or None for key, value in row.items()}
+
+    product = {
+        key: row.get(key) for key in ("title", "description", "brand", "country")
+    }
+    product["stock"] = row.get("stock")
+    if row.get("price_retail") or row.get("price_wholesale"):
+        product["price"] = {
+            "retail": row.get("price_retail"),
+            "wholesale": row.get("price_wholesale"),
+        }
+    for field in ("category_titles", "tags"):
+        if row.get(field):
+            product[field] = [
+                value.strip()
+                for value in row[field].split(CSV_LIST_SEPARATOR)
+                if value.strip()
+            ]
+
+    return product
+
+
+def validate_product(row: dict) -> ProductDTO:
+    # поля DTO оголошені як str = None, тож явний None pydantic не пропускає,
+    # порожні значення просто не передаються
+    try:
+        product = product_adapter.validate_python(clear_none(row) or {})
+    except ValidationError as error:
+        first = error.errors()[0]
+        location = ".".join(str(part) for part in first["loc"])
+        raise ValueError(f"{location}: {first['msg']}")
+
+    for field in REQUIRED_FIELDS:
+        if not getattr(product, field):
+            raise ValueError(f"{field}: field required")
+
+    return product
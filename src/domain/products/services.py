@@ -1,3 +1,4 @@
+import hashlib
 from dataclasses import asdict
 from datetime import datetime
 
@@ -5,9 +6,42 @@ from bson import ObjectId
 from fastapi import HTTPException
 from slugify import slugify
 
-from src.domain.tools.common import clear_none, convert_obj_ids
-from src.presentation.products.dto import CommentDTO, ProductDTO
+from core import config
+from src.domain.products.imports import (
+    IMPORT_BATCH_SIZE,
+    read_csv,
+    read_ndjson,
+    validate_product,
+)
+from src.domain.tools.common import clear_none, parse_fields, pick_fields
+from src.domain.tools.search import product_search_fields, search_terms
+from src.presentation.products.dto import CommentDTO, ModerationDTO, ProductDTO
+from src.repositories.products.categories import category_index
+from src.repositories.products.leaderboard import (
+    LEADERBOARD_VERSION_KEY,
+    LEADERBOARDS,
+)
+from src.repositories.products.query import ProductQuery
 from src.repositories.products.repository import CommentRepository, ProductRepository
+from src.repositories.products.slugs import slug_index
+from src.repositories.products.versions import (
+    CATALOG_VERSION_KEY,
+    VersionRepository,
+)
+
+PRODUCT_FIELDS = {
+    "title",
+    "slug",
+    "description",
+    "brand",
+    "country",
+    "price",
+    "category_ids",
+    "tags",
+    "rating",
+    "created_at",
+}
+MODERATION_RESULTS = ("approve", "rejex")
 
 
 class CommentsDomain:
@@ -31,46 +65,163 @@ class CommentsDomain:
 
         return {"user_comment": user_comments}
 
-    async def get_unmoder_comments(self):
-        unmoder_list = await self.comment.select_unmoder_comments()
-        return convert_obj_ids(unmoder_list)
+    async def get_unmoder_comments(self, moderator: str, limit: int):
+        return await self.comment.claim_unmoder_comments(
+            moderator, limit, config.COMMENT_LEASE_SECONDS
+        )
 
     async def moderate_comment(self, comment_id: str, result: str):
         return await self.comment.update_comment(ObjectId(comment_id), result)
 
+    async def moderate_many(self, decisions: list[ModerationDTO]) -> dict:
+        to_apply = {}
+        errors = []
+
+        for decision in decisions:
+            comment_id = decision.comment_id
+            if not ObjectId.is_valid(comment_id):
+                errors.append({"comment_id": comment_id, "error": "invalid id"})
+                continue
+            if decision.result not in MODERATION_RESULTS:
+                errors.append({"comment_id": comment_id, "error": "unknown action"})
+                continue
+            to_apply[ObjectId(comment_id)] = decision.result
+
+        if not to_apply:
+            return {"approved": 0, "deleted": 0, "errors": errors}
+
+        result = await self.comment.moderate_comments(to_apply)
+        for comment_id in result.pop("missed"):
+            errors.append(
+                {
+                    "comment_id": str(comment_id),
+                    "error": "not found or already moderated",
+                }
+            )
+        return {**result, "errors": errors}
+
 
 class ProductDomain(CommentsDomain):
 
     async def add_product(self, data: ProductDTO):
-        data_to_save = asdict(data)
-        data_to_save["tags"].append("new")
+        data_to_save = self.prepare_product(asdict(data))
+
+        new_object = await self.repo.create_product(data_to_save)
+
+        return {"product": str(new_object.inserted_id)}
+
+    async def import_products(self, chunks, file_format: str) -> dict:
+        rows = read_csv(chunks) if file_format == "csv" else read_ndjson(chunks)
+        inserted = 0
+        errors = []
+        batch = {}
+
+        async for number, row, error in rows:
+            if error is None:
+                try:
+                    product = self.prepare_product(asdict(validate_product(row)))
+                    batch[number] = product
+                except ValueError as validation_error:
+                    error = str(validation_error)
+
+            if error is not None:
+                errors.append({"row": number, "error": error})
+
+            if len(batch) == IMPORT_BATCH_SIZE:
+                inserted += await self.__import_batch(batch, errors)
+                batch = {}
+
+        if batch:
+            inserted += await self.__import_batch(batch, errors)
+
+        errors.sort(key=lambda item: item["row"])
+        return {"inserted": inserted, "errors": errors}
+
+    async def __import_batch(self, batch: dict, errors: list) -> int:
+        numbers = list(batch)
+        created, failed = await self.repo.create_products(list(batch.values()))
+
+        for position, error in failed.items():
+            errors.append({"row": numbers[position], "error": error})
+        return len(created)
+
+    @staticmethod
+    def prepare_product(data_to_save: dict) -> dict:
+        tags = data_to_save.get("tags") or []
+        data_to_save["tags"] = [*tags, "new"] if "new" not in tags else tags
         data_to_save.update(
             {
                 "slug": slugify(data_to_save.get("title")),
                 "created_at": datetime.now(),
                 "available": True,
+                "rating": 0,
+                "version": 0,
+                "search": product_search_fields(data_to_save),
             }
         )
+        return data_to_save
 
-        new_object = await self.repo.create_product(data_to_save)
+    async def retrieve_product(self, slug, fields: str = None):
+        fields = parse_fields(fields, PRODUCT_FIELDS | {"comments"})
 
-        return {"product": str(new_object.inserted_id)}
+        # неіснуючі slug відсікаються без запитів до Redis-кешу і Mongo
+        if await slug_index.resolve(slug) is None:
+            raise HTTPException(404, {"message": "product dont found"})
+
+        # кеш зберігає повну сторінку товару, поля вибираються з неї
+        cached = await self.repo.cache.get(slug)
+        if cached is not None:
+            return {"detail": pick_fields(cached["detail"], fields)}
 
-    async def retrieve_product(self, slug):
         current = await self.repo.product_by_slug(slug)
 
         if current is None:
             raise HTTPException(404, {"message": "product dont found"})
         comment_list = await self.repo.get_comment_by_post(slug)
         current["comments"] = comment_list
-        return {"detail": current}
+
+        await self.repo.cache.set(slug, {"detail": current})
+        return {"detail": pick_fields(current, fields)}
+
+    def cache_stats(self) -> dict:
+        return self.repo.cache.stats()
+
+    async def list_etag(self, params: list[tuple[str, str]]) -> str:
+        # версія каталогу + нормалізовані параметри запиту; списки, що читаються
+        # з лідербордів, залежать ще й від їх версії (продажі не змінюють каталог)
+        keys = [CATALOG_VERSION_KEY]
+        if dict(params).get("sort") in LEADERBOARDS:
+            keys.append(LEADERBOARD_VERSION_KEY)
+
+        versions = await VersionRepository().counters(*keys)
+        version = "-".join(map(str, versions))
+        query = "&".join(f"{key}={value}" for key, value in sorted(params))
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        return f'"c{version}-{digest}"'
+
+    async def product_etag(self, slug: str, fields: str = None) -> str | None:
+        product_id = await slug_index.resolve(slug)
+        if product_id is None:
+            return None
+
+        version = await VersionRepository().product(str(product_id))
+        if not fields:
+            return f'"p{product_id}-{version}"'
+
+        digest = hashlib.sha1(fields.encode("utf-8")).hexdigest()[:16]
+        return f'"p{product_id}-{version}-{digest}"'
 
     async def update_product(self, slug: str, data: dict) -> dict:
         product_data = clear_none(data)
-        product_data["slug"] = slugify(product_data["title"])
         if product_data is None:
             return {"error": "data is empty"}
 
+        if product_data.get("title"):
+            product_data["slug"] = slugify(product_data["title"])
+
+        for field, terms in product_search_fields(product_data).items():
+            product_data[f"search.{field}"] = terms
+
         tags = product_data.pop("tags", None)
         category_titles = product_data.pop("category_titles", None)
 
@@ -90,36 +241,61 @@ class ProductDomain(CommentsDomain):
     async def delete_product(self, slug):
         result = await self.repo.delete_product(slug)
 
-        if result.deleted_count < 1:
+        if result is None:
             return {"code": 404, "message": "product not found"}
 
-        return {"delete": result.deleted_count}
+        return {"delete": 1}
 
-    async def get_products(self, filtering_data: dict):
+    async def get_products(
+        self,
+        filtering_data: dict,
+        sort: str,
+        limit: int,
+        cursor: str = None,
+        fields: str = None,
+    ) -> dict:
+        fields = parse_fields(fields, PRODUCT_FIELDS)
 
-        f = self.generate_filtering_data(filtering_data)
+        query = self.generate_filtering_data(filtering_data)
+        await self.check_categories(query.categories)
 
-        return await self.repo.select_product_list(f)
+        # за замовчуванням пошук сортується за релевантністю
+        if sort is None:
+            sort = "relevance" if query.text else "newest"
 
-    @classmethod
-    def generate_filtering_data(cls, filtering_data: dict) -> dict:
+        product_list, next_cursor = await self.repo.select_product_list(
+            query, sort, limit, cursor, fields=fields
+        )
+        return {"products": product_list, "next": next_cursor}
 
-        f = {}
-        if filtering_data.get("tag"):
-            f.update({"tags": filtering_data.get("tag")})
+    async def get_facets(self, filtering_data: dict) -> dict:
+        query = self.generate_filtering_data(filtering_data)
+        await self.check_categories(query.categories)
 
-        if filtering_data.get("category"):
-            f.update({"category_ids.title": filtering_data.get("category")})
+        return {"facets": await self.repo.facet_counts(query.filter())}
 
-        if filtering_data.get("price_lt"):
-            f.update({"price.retail": {"$lt": filtering_data.get("price_lt")}})
+    @staticmethod
+    async def check_categories(titles: list[str]):
+        if not titles:
+            return
 
-        if filtering_data.get("price_gt"):
-            f.update({"price.retail": {"$gt": filtering_data.get("price_gt")}})
+        known = await category_index.titles()
+        unknown = [title for title in titles if title not in known]
+        if unknown:
+            error = {"error": f"unknown categories: {', '.join(unknown)}"}
+            raise HTTPException(400, {**error, "allowed": sorted(known)})
 
-        if filtering_data.get("title"):
-            f.update(
-                {"title": {"$regex": filtering_data.get("title"), "$options": "i"}}
-            )
+    async def refresh_categories(self) -> dict:
+        await category_index.bump()
+        return {"categories": sorted(await category_index.titles())}
 
-        return f
+    @classmethod
+    def generate_filtering_data(cls, filtering_data: dict) -> ProductQuery:
+        return ProductQuery(
+            tags=list(dict.fromkeys(filtering_data.get("tag") or [])),
+            all_tags=filtering_data.get("tag_match") == "all",
+            categories=list(dict.fromkeys(filtering_data.get("category") or [])),
+            price_gt=filtering_data.get("price_gt"),
+            price_lt=filtering_data.get("price_lt"),
+            text=search_terms(filtering_data.get("title")) or None,
+        )
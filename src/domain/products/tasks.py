@@ -1,14 +1,188 @@
 from datetime import datetime, timedelta
 
-from core.celery import app
-from core.config import products
+from pymongo import UpdateOne
+
+from core.celery import MaintenanceJob, app
+from core.config import redis_client, sync_db, sync_redis_client
+from src.domain.tools.search import product_search_fields
+from src.repositories.products.cache import ProductCache
+from src.repositories.products.leaderboard import (
+    LEADERBOARD_VERSION_KEY,
+    RATING_LEADERBOARD_KEY,
+    SOLD_LEADERBOARD_KEY,
+)
+from src.repositories.products.versions import CATALOG_VERSION_KEY, PRODUCT_VERSIONS_KEY
+
+
+@app.task(base=MaintenanceJob, bind=True)
+def delete_new_tag(self, days: int = 7, batch_size: int = None, pause: float = None):
+    removal_threshold = datetime.now() - timedelta(days=days)
+    query = {"tags": "new", "created_at": {"$lt": removal_threshold}}
+
+    def expire(product: dict) -> UpdateOne:
+        return UpdateOne(
+            {"_id": product["_id"], "tags": "new"},
+            {"$pull": {"tags": "new"}, "$inc": {"version": 1}},
+        )
+
+    result = self.run_in_batches(
+        "products",
+        query,
+        expire,
+        {"slug": 1, "version": 1},
+        batch_size,
+        pause,
+        on_batch=publish_changes,
+    )
+    return f"Delete tags for {result['modified']} products"
+
+
+def publish_changes(product_list: list):
+    # те саме, що ProductRepository.update_product робить після запису:
+    # скидає кеш сторінок, оновлює версії товарів і каталогу
+    with sync_redis_client.pipeline(transaction=True) as pipe:
+        for product in product_list:
+            pipe.delete(ProductCache.key(product["slug"]))
+            version = product.get("version", 0) + 1
+            pipe.hset(PRODUCT_VERSIONS_KEY, str(product["_id"]), version)
+        pipe.incr(CATALOG_VERSION_KEY)
+        pipe.execute()
 
 
 @app.task
-async def delete_new_tag():
-    removal_threshold = datetime.now() - timedelta(days=7)
-    products.update_many(
-        {"tags": "new", "created_at": {"$lt": removal_threshold}},
-        {"$pull": {"tags": "new"}},
+def rebuild_search_terms(batch_size: int = 1000):
+    # заповнює поле search для товарів, створених до появи повнотекстового пошуку
+    updated = 0
+    batch = []
+    collection = sync_db["products"]
+    cursor = collection.find({}, {"title": 1, "description": 1})
+
+    for product in cursor.batch_size(batch_size):
+        search = product_search_fields(product)
+        batch.append(UpdateOne({"_id": product["_id"]}, {"$set": {"search": search}}))
+
+        if len(batch) == batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+
+    return f"Rebuild search terms for {updated} products"
+
+
+@app.task
+def rebuild_rating_aggregates(batch_size: int = 1000):
+    # перераховує rating_sum / rating_count з підтверджених коментарів
+    collection = sync_db["products"]
+    pipeline = [
+        {"$match": {"moderate": 1}},
+        {
+            "$group": {
+                "_id": "$product",
+                "sum": {"$sum": "$score"},
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+
+    rated = []
+    batch = []
+    for aggregate in sync_db["comments"].aggregate(pipeline, batchSize=batch_size):
+        rated.append(aggregate["_id"])
+        rating = round(aggregate["sum"] / aggregate["count"], 2)
+        batch.append(
+            UpdateOne(
+                {"slug": aggregate["_id"]},
+                {
+                    "$set": {
+                        "rating_sum": aggregate["sum"],
+                        "rating_count": aggregate["count"],
+                        "rating": rating,
+                    }
+                },
+            )
+        )
+
+        if len(batch) == batch_size:
+            collection.bulk_write(batch, ordered=False)
+            batch = []
+
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+
+    # товари без підтверджених коментарів
+    collection.update_many(
+        {"slug": {"$nin": rated}, "rating_count": {"$ne": 0}},
+        {"$set": {"rating_sum": 0, "rating_count": 0, "rating": 0}},
     )
-    return f"Delete tags successfully"
+
+    # у лідерборд потрапляють і товари без оцінок, як і в сортуванні Mongo
+    scores = collection.find({}, {"rating": 1}).batch_size(batch_size)
+    rebuild_leaderboard(
+        RATING_LEADERBOARD_KEY,
+        ((str(product["_id"]), product.get("rating", 0)) for product in scores),
+        batch_size,
+    )
+
+    return f"Rebuild rating for {len(rated)} products"
+
+
+@app.task
+def rebuild_sales_leaderboard(batch_size: int = 1000):
+    # leaderboard:sold з рядків збережених замовлень
+    pipeline = [
+        {"$unwind": "$items_line"},
+        {"$match": {"items_line.product_id": {"$ne": None}}},
+        {
+            "$group": {
+                "_id": "$items_line.product_id",
+                "sold": {"$sum": "$items_line.qty"},
+            }
+        },
+    ]
+    sold = sync_db["orders"].aggregate(pipeline, batchSize=batch_size)
+    rebuild_leaderboard(
+        SOLD_LEADERBOARD_KEY,
+        ((str(line["_id"]), line["sold"]) for line in sold),
+        batch_size,
+    )
+
+    return "Rebuild sales leaderboard"
+
+
+def rebuild_leaderboard(key: str, scores, batch_size: int):
+    # множина будується в тимчасовому ключі і підміняється атомарно через RENAME
+    tmp_key = f"{key}:tmp"
+    sync_redis_client.delete(tmp_key)
+
+    mapping = {}
+    for product_id, score in scores:
+        mapping[product_id] = score
+
+        if len(mapping) == batch_size:
+            sync_redis_client.zadd(tmp_key, mapping)
+            mapping = {}
+
+    if mapping:
+        sync_redis_client.zadd(tmp_key, mapping)
+
+    with sync_redis_client.pipeline(transaction=True) as pipe:
+        if sync_redis_client.exists(tmp_key):
+            pipe.rename(tmp_key, key)
+        else:
+            pipe.delete(key)
+        pipe.incr(LEADERBOARD_VERSION_KEY)
+        pipe.execute()
+
+
+# заповнюють поля і лідерборди для даних, створених до їх появи
+BACKFILLS = (rebuild_search_terms, rebuild_rating_aggregates, rebuild_sales_leaderboard)
+
+
+async def schedule_backfills():
+    # кожна задача ставиться в чергу один раз на базу: ключ migrations:<задача>
+    # фіксує запуск, після його видалення задача запуститься на наступному старті
+    for task in BACKFILLS:
+        if await redis_client.set(f"migrations:{task.name}", 1, nx=True):
+            task.delay()
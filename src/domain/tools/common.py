@@ -1,3 +1,11 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi import HTTPException
+
+
 def clear_none(data: dict) -> dict | None:
     to_return = {}
 
@@ -8,5 +16,46 @@ def clear_none(data: dict) -> dict | None:
     return to_return if len(to_return) > 0 else None
 
 
-def convert_obj_ids(items: list):
-    return list(map(lambda x: {**x, "_id": str(x["_id"])}, items))
+def utc_naive(value: datetime = None) -> datetime:
+    # дати в базі наївні в UTC; aware-дата з запиту зводиться до UTC,
+    # без аргументу - поточний час
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def json_default(value):
+    # datetime, dataclass і вкладені структури orjson кодує сам
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def parse_fields(fields: str | None, allowed: set) -> list | None:
+    # ?fields=title,slug -> ["title", "slug"], лише поля з дозволеного списку
+    if not fields:
+        return None
+
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        error = {"error": f"unknown fields: {', '.join(unknown)}"}
+        raise HTTPException(400, {**error, "allowed": sorted(allowed)})
+
+    return requested or None
+
+
+def pick_fields(document: dict, fields: list | None) -> dict:
+    if fields is None:
+        return document
+    return {key: value for key, value in document.items() if key in fields}
@@ -0,0 +1,91 @@
+import re
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# закінчення української та російської мов, від довших до коротших
+SUFFIXES = sorted(
+    {
+        "ами",
+        "ями",
+        "ого",
+        "ому",
+        "ими",
+        "іми",
+        "его",
+        "ему",
+        "ыми",
+        "ові",
+        "еві",
+        "ах",
+        "ях",
+        "ів",
+        "їв",
+        "ий",
+        "ій",
+        "ая",
+        "яя",
+        "ої",
+        "ою",
+        "ею",
+        "ом",
+        "ем",
+        "ам",
+        "ям",
+        "их",
+        "іх",
+        "ой",
+        "ей",
+        "ый",
+        "ое",
+        "ее",
+        "ые",
+        "ие",
+        "ов",
+        "ев",
+        "а",
+        "я",
+        "у",
+        "ю",
+        "о",
+        "е",
+        "є",
+        "и",
+        "і",
+        "ї",
+        "ы",
+        "ь",
+    },
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+
+
+def stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+
+    text = text.lower().replace("ё", "е").replace("'", "").replace("’", "")
+    return [stem(token) for token in TOKEN_RE.findall(text)]
+
+
+def search_terms(text: str | None) -> str:
+    # основи слів через пробіл, текстовий індекс створено з мовою "none",
+    # тому MongoDB не застосовує власний стемінг поверх нашого
+    return " ".join(dict.fromkeys(tokenize(text)))
+
+
+def product_search_fields(product: dict) -> dict:
+    fields = {}
+    if "title" in product:
+        fields["title"] = search_terms(product["title"])
+    if "description" in product:
+        fields["text"] = search_terms(product["description"])
+    return fields
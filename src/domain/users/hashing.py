@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from core import config
+
+
+# bcrypt відпускає GIL під час хешування, тому пулу потоків достатньо
+class PasswordHasher:
+    def __init__(self, rounds: int, workers: int, queue_limit: int) -> None:
+        # min/max rounds дорівнюють поточній вартості, тому хеші з іншою
+        # вартістю вважаються застарілими і перераховуються під час логіну
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self.__executor = ThreadPoolExecutor(workers, thread_name_prefix="bcrypt")
+        self.__limit = asyncio.Semaphore(workers)
+        self.__queue_limit = queue_limit
+
+        self.rounds = rounds
+        self.workers = workers
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self.__run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self.__run(self.context.verify, password, hashed)
+
+    async def verify_and_update(
+        self, password: str, hashed: str
+    ) -> tuple[bool, str | None]:
+        return await self.__run(self.context.verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    async def __run(self, func, *args):
+        if self.waiting >= self.__queue_limit:
+            self.rejected += 1
+            raise HTTPException(503, {"error": "server is busy, try again later"})
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self.__limit.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.__limit.release()
+
+
+hasher = PasswordHasher(
+    config.BCRYPT_ROUNDS, config.PASSWORD_WORKERS, config.PASSWORD_QUEUE_LIMIT
+)
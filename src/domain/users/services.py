@@ -5,7 +5,6 @@ import jwt
 from bson import ObjectId
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 
 from core import config
 from core.config import redis_client
@@ -13,10 +12,10 @@ from src.domain.tools.common import clear_none
 from src.presentation.users.dto import RegisterDTO, RoleEnum
 from src.repositories.users.repository import UserRepository
 
-bcrypt = CryptContext(schemes=["bcrypt"])
-
+from .hashing import hasher
 
 bearer = OAuth2PasswordBearer(tokenUrl="users/login")
+optional_bearer = OAuth2PasswordBearer(tokenUrl="users/login", auto_error=False)
 
 
 class UserDomain:
@@ -32,7 +31,7 @@ class UserDomain:
         register_data.pop("password2")
         register_data.update(
             {
-                "hash_password": bcrypt.hash(register_data.pop("password1")),
+                "hash_password": await hasher.hash(register_data.pop("password1")),
                 "role": RoleEnum.client.name if not admin else RoleEnum.admin.name,
                 "created_at": datetime.now(),
             }
@@ -62,19 +61,21 @@ class UserDomain:
         return {"update": updated_profile}
 
     async def set_password(self, email, data: dict):
-        check_spam = self.throlling_password_changes(email)
+        check_spam = await self.throlling_password_changes(email)
         if check_spam:
             return {"error": f"u can try againg after {check_spam} seconds"}
 
         compare_result = await self.compare_password(email, data.get("old_password"))
 
         if compare_result is False:
-            self.__update_spam_status(email)
+            await self.__update_spam_status(email)
+            return {"error": "old password is wrong"}
 
         self.__check_passwords(data)
 
-        to_update = {"hash_password": bcrypt.hash(data.get("password1"))}
-        await self.update_profile(email, to_update, password=True)
+        new_hash = await hasher.hash(data.get("password1"))
+        to_update = {"$set": {"hash_password": new_hash}}
+        await self.repo.update_user(email, to_update, password=True)
         return {"ok": "update"}
 
     async def user_list(self):
@@ -96,23 +97,25 @@ class UserDomain:
     async def compare_password(self, email, old_pw):
         user = await self.repo.get_user_password(email)
 
-        result = bcrypt.verify(old_pw, user["hash_password"])
+        result = await hasher.verify(old_pw, user["hash_password"])
         return result
 
     @classmethod
-    def __update_spam_status(cls, email: str):
-        redis_client.incrby(f"spam_contlor:{email}", 1)
-        redis_client.expire(f"spam_contlor:{email}", 360)
+    async def __update_spam_status(cls, email: str):
+        spam_key = f"spam_contlor:{email}"
+        async with redis_client.pipeline(transaction=True) as pipe:
+            attempts, _ = await pipe.incrby(spam_key, 1).expire(spam_key, 360).execute()
 
-        if int(redis_client.get(f"spam_contlor:{email}")) > 3:
-            redis_client.set(f"block:{email}", 1, 60)
+        if attempts > 3:
+            await redis_client.set(f"block:{email}", 1, 60)
             raise HTTPException(400, {"error": "rate limit"})
 
     @classmethod
-    def throlling_password_changes(cls, email) -> bool:
+    async def throlling_password_changes(cls, email) -> bool:
         block_key = f"block:{email}"
-        if redis_client.get(block_key):
-            return redis_client.ttl(block_key)
+        ttl = await redis_client.ttl(block_key)
+        if ttl > 0:
+            return ttl
 
         return False
 
@@ -133,9 +136,16 @@ class AuthService:
         current_user = await self.repo.get_user_by_email(data.username)
         if current_user is None:
             return {"error": "username or password is wrong"}
-        verify = bcrypt.verify(data.password, current_user["hash_password"])
+        verify, new_hash = await hasher.verify_and_update(
+            data.password, current_user["hash_password"]
+        )
         if not verify:
             return {"error": "username or password is wrong"}
+
+        # хеш зі старою вартістю перераховується під час успішного логіну
+        if new_hash:
+            to_update = {"$set": {"hash_password": new_hash}}
+            await self.repo.update_user(current_user["email"], to_update, password=True)
         token = self.__generate_token(
             current_user["_id"], current_user["email"], current_user["role"]
         )
@@ -167,4 +177,11 @@ def authenticated(token: Annotated[str, Depends(bearer)]):
     return auth.verify_token(token)
 
 
+def maybe_authenticated(token: Annotated[str | None, Depends(optional_bearer)]):
+    if token is None:
+        return None
+    return auth.verify_token(token)
+
+
 current_user = Annotated[dict, Depends(authenticated)]
+optional_user = Annotated[dict | None, Depends(maybe_authenticated)]
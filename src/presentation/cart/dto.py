@@ -0,0 +1,7 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class CartItemDTO:
+    slug: str
+    qty: int
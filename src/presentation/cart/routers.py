@@ -3,8 +3,11 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Request
 
 from src.domain.cart.services import CartDomain
+from src.presentation.responses import BSONRoute
 
-cart_router = APIRouter(prefix="/cart", tags=["cart"])
+from .dto import CartItemDTO
+
+cart_router = APIRouter(prefix="/cart", tags=["cart"], route_class=BSONRoute)
 
 
 @cart_router.get("/")
@@ -14,7 +17,16 @@ async def fetch_cart_data(request: Request, service: Annotated[CartDomain, Depen
 
 @cart_router.post("/")
 async def clear_cart(request: Request, service: Annotated[CartDomain, Depends()]):
-    return service.delete_cart(request.cookies.get("session_key"))
+    return await service.delete_cart(request.cookies.get("session_key"))
+
+
+@cart_router.post("/items")
+async def add_items(
+    request: Request,
+    items: list[CartItemDTO],
+    service: Annotated[CartDomain, Depends()],
+):
+    return await service.add_many_to_cart(request.cookies.get("session_key"), items)
 
 
 @cart_router.post("/{product_slug}")
@@ -1,21 +1,30 @@
 from dataclasses import asdict
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 from src.domain.orders.services import OrderDomain
+from src.domain.users.services import current_user, optional_user
+from src.presentation.responses import BSONRoute
 
 from .dto import CreateOrderDto
 
-order_router = APIRouter(tags=["orders"])
+order_router = APIRouter(tags=["orders"], route_class=BSONRoute)
 
 
 @order_router.post("/orders")
 async def create_order(
-    request: Request, data: CreateOrderDto, service: Annotated[OrderDomain, Depends()]
+    request: Request,
+    data: CreateOrderDto,
+    user: optional_user,
+    service: Annotated[OrderDomain, Depends()],
 ):
     link = await service.complete_order(
-        request.cookies.get("session_key"), asdict(data)
+        request.cookies.get("session_key"),
+        asdict(data),
+        user.get("user_id") if user else None,
     )
 
     if link is None:
@@ -35,10 +44,35 @@ async def get_payment_data(request: Request):
 
 
 @order_router.get("/orders-history")
-async def get_order_list(service: Annotated[OrderDomain, Depends()]):
-    return await service.fetch_orders()
+async def get_order_list(
+    user: current_user,
+    service: Annotated[OrderDomain, Depends()],
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = Query(None, alias="next"),
+    fields: str = None,
+):
+    return await service.fetch_orders(user.get("user_id"), limit, cursor, fields)
 
 
 @order_router.get("/orders/{order_id}")
 async def get_order_data(order_id: str, service: Annotated[OrderDomain, Depends()]):
     return await service.fetch_one_order(order_id)
+
+
+@order_router.get("/admin/orders/export")
+async def export_orders(
+    user: current_user,
+    service: Annotated[OrderDomain, Depends()],
+    file_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    date_from: datetime = None,
+    date_to: datetime = None,
+):
+    if user.get("role") != "admin":
+        raise HTTPException(403, "you dont have permission")
+
+    media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        service.export_orders(file_format, date_from, date_to),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=orders.{file_format}"},
+    )
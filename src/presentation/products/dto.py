@@ -15,6 +15,14 @@ class CommentDTO:
     score: int
 
 
+@dataclass
+class ModerationDTO:
+    # дія перевіряється для кожного рішення окремо, щоб одне хибне
+    # не відхиляло весь пакет
+    comment_id: str
+    result: str
+
+
 @dataclass
 class ReadCommentDTO:
     title: str
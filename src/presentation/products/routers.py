@@ -1,36 +1,84 @@
 from dataclasses import asdict
 from typing import Annotated, Literal
 
-from fastapi import APIRouter, Body, Depends, Request
+from fastapi import APIRouter, Body, Depends, Query, Request, Response
 
 from src.domain.cart.services import CartDomain
 from src.domain.products.bookmarks import BookmarkDomain
 from src.domain.products.services import CommentDTO, ProductDomain
 from src.domain.users.services import current_user
+from src.presentation.responses import BSONRoute
 
-from .dto import ProductDTO
+from .dto import ModerationDTO, ProductDTO
 
-product_router = APIRouter()
+product_router = APIRouter(route_class=BSONRoute)
+
+
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
 
 
 @product_router.get("/products", tags=["products"])
 async def fetch_product_list(
+    request: Request,
+    response: Response,
     service: Annotated[ProductDomain, Depends()],
     title: str = None,
-    tag: str = None,
-    category: Literal["for dogs", "for cats", "for fish"] = None,
+    tag: list[str] = Query(None),
+    tag_match: Literal["any", "all"] = "any",
+    category: list[str] = Query(None),
     price_gt: int = None,
     price_lt: int = None,
+    sort: Literal["relevance", "newest", "price", "rating", "bestselling"] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = Query(None, alias="next"),
+    fields: str = None,
 ):
+    # 304 віддається до запиту в Mongo
+    etag = await service.list_etag(request.query_params.multi_items())
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers=dict(response.headers))
+
     filtering_data = {
         "title": title,
         "tag": tag,
+        "tag_match": tag_match,
         "category": category,
         "price_gt": price_gt,
         "price_lt": price_lt,
     }
 
-    return await service.get_products(filtering_data)
+    return await service.get_products(filtering_data, sort, limit, cursor, fields)
+
+
+@product_router.get("/products/facets", tags=["products"])
+async def fetch_product_facets(
+    service: Annotated[ProductDomain, Depends()],
+    title: str = None,
+    tag: list[str] = Query(None),
+    tag_match: Literal["any", "all"] = "any",
+    category: list[str] = Query(None),
+    price_gt: int = None,
+    price_lt: int = None,
+):
+    filtering_data = {
+        "title": title,
+        "tag": tag,
+        "tag_match": tag_match,
+        "category": category,
+        "price_gt": price_gt,
+        "price_lt": price_lt,
+    }
+
+    return await service.get_facets(filtering_data)
 
 
 @product_router.post("/products", tags=["products"])
@@ -43,9 +91,49 @@ async def create_product(
     return await service.add_product(data)
 
 
+@product_router.post("/admin/products/import", tags=["products"])
+async def import_products(
+    request: Request,
+    user: current_user,
+    service: Annotated[ProductDomain, Depends()],
+    file_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+):
+    if user.get("role") != "admin":
+        return {"error": "permission danied"}
+    return await service.import_products(request.stream(), file_format)
+
+
+@product_router.post("/admin/categories/refresh", tags=["products"])
+async def refresh_categories(
+    user: current_user, service: Annotated[ProductDomain, Depends()]
+):
+    if user.get("role") != "admin":
+        return {"error": "permission danied"}
+    return await service.refresh_categories()
+
+
+@product_router.get("/admin/product-cache", tags=["products"])
+async def fetch_product_cache_stats(
+    user: current_user, service: Annotated[ProductDomain, Depends()]
+):
+    if user.get("role") != "admin":
+        return {"error": "permission danied"}
+    return service.cache_stats()
+
+
 @product_router.get("/products/{slug}", tags=["products"])
-async def product_detail(service: Annotated[ProductDomain, Depends()], slug: str):
-    return await service.retrieve_product(slug)
+async def product_detail(
+    request: Request,
+    response: Response,
+    service: Annotated[ProductDomain, Depends()],
+    slug: str,
+    fields: str = None,
+):
+    etag = await service.product_etag(slug, fields)
+    if etag and not_modified(request, response, etag):
+        return Response(status_code=304, headers=dict(response.headers))
+
+    return await service.retrieve_product(slug, fields)
 
 
 @product_router.patch("/products/{slug}", tags=["products"])
@@ -77,10 +165,24 @@ async def add_comment_to_product(
 
 @product_router.get("/admin/comments", tags=["comments"])
 async def fetch_unmoder_comments(
-    user: current_user, service: Annotated[ProductDomain, Depends()]
+    user: current_user,
+    service: Annotated[ProductDomain, Depends()],
+    limit: int = Query(20, ge=1, le=100),
 ):
+    if user.get("role") != "admin":
+        return {"error": "permission danied"}
+    return await service.get_unmoder_comments(user.get("user_id"), limit)
+
 
-    return await service.get_unmoder_comments()
+@product_router.patch("/admin/comments", tags=["comments"])
+async def patch_comments(
+    user: current_user,
+    service: Annotated[ProductDomain, Depends()],
+    decisions: list[ModerationDTO],
+):
+    if user.get("role") != "admin":
+        return {"error": "permission danied"}
+    return await service.moderate_many(decisions)
 
 
 @product_router.patch("/admin/comments/{comment_id}/", tags=["comments"])
@@ -104,9 +206,9 @@ async def bookmark_action(
 
 @product_router.get("/bookmarks", tags=["bookmarks"])
 async def bookmark_list(
-    service: Annotated[BookmarkDomain, Depends()], request: Request
+    service: Annotated[BookmarkDomain, Depends()], request: Request, fields: str = None
 ):
-    return await service.bookmarks_list(request.cookies.get("session_key"))
+    return await service.bookmarks_list(request.cookies.get("session_key"), fields)
 
 
 @product_router.post("/products/{slug}/add-to-cart", tags=["cart"])
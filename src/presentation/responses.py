@@ -0,0 +1,40 @@
+import functools
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+
+from src.domain.tools.common import dumps
+
+
+class BSONJSONResponse(JSONResponse):
+    # ObjectId, datetime і Decimal кодуються напряму, без jsonable_encoder
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class BSONRoute(APIRoute):
+    # FastAPI пропускає jsonable_encoder лише для готових Response,
+    # тому результат ендпоінта одразу загортається в BSONJSONResponse
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        status_code = kwargs.get("status_code") or 200
+
+        @functools.wraps(endpoint)
+        async def encode_response(*args, **kw):
+            content = await endpoint(*args, **kw)
+            if isinstance(content, Response):
+                return content
+
+            response = BSONJSONResponse(content, status_code=status_code)
+
+            # заголовки і статус, встановлені через параметр Response (ETag тощо)
+            for value in kw.values():
+                if isinstance(value, Response):
+                    response.raw_headers.extend(value.raw_headers)
+                    if value.status_code:
+                        response.status_code = value.status_code
+
+            return response
+
+        super().__init__(path, encode_response, **kwargs)
@@ -5,11 +5,13 @@ from fastapi import APIRouter, Body, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
 from src.domain.products.services import ProductDomain
+from src.domain.users.hashing import hasher
 from src.domain.users.services import AuthService, UserDomain, current_user
+from src.presentation.responses import BSONRoute
 
 from .dto import ChangePasswordDTO, RegisterDTO, RoleEnum, UpdateUserDTO
 
-users_router = APIRouter(prefix="/users", tags=["auth"])
+users_router = APIRouter(prefix="/users", tags=["auth"], route_class=BSONRoute)
 
 
 @users_router.post("/register")
@@ -75,3 +77,10 @@ async def get_users(
     if user.get("role") != RoleEnum.admin.value:
         raise HTTPException(403, "you dont have permission")
     return await service.change_user_privilege(email, role, remove)
+
+
+@users_router.get("/admin/hashing-stats")
+async def get_hashing_stats(user: current_user):
+    if user.get("role") != "admin":
+        raise HTTPException(403, "you dont have permission")
+    return hasher.stats()
@@ -1,35 +1,177 @@
+import json
+
+from core.config import products
 from src.repositories.products.repository import ProductRepository
+from src.repositories.products.slugs import slug_index
+from src.repositories.products.versions import PRODUCT_VERSIONS_KEY
+
+SNAPSHOT_FIELDS = {"title": 1, "slug": 1, "price": 1, "version": 1}
+
+# кількості, знімки та актуальні версії товарів кошика за один запит до Redis
+READ_CART_SCRIPT = """
+local items = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+local snapshots = redis.call('HGETALL', KEYS[2])
+local ids = {}
+for i = 1, #items, 2 do
+    ids[#ids + 1] = items[i]
+end
+local versions = {}
+if #ids > 0 then
+    versions = redis.call('HMGET', KEYS[3], unpack(ids))
+end
+return {items, snapshots, versions}
+"""
 
 
 class CartRepository(ProductRepository):
-    async def add_to_cart(self, session_key: str, slug: str, qty: int):
-        product = await self.product_by_slug(slug)
-        key = f"cart:{session_key}"
-        self.redis.zadd(key, mapping={str(product["_id"]): qty}, incr=True)
+    def __init__(self) -> None:
+        super().__init__()
+        self.read_cart = self.redis.register_script(READ_CART_SCRIPT)
+
+    @staticmethod
+    def cart_keys(session_key: str) -> tuple[str, str]:
+        return f"cart:{session_key}", f"cart:{session_key}:items"
+
+    @staticmethod
+    def make_snapshot(product: dict) -> dict:
+        return {
+            "title": product["title"],
+            "slug": product["slug"],
+            "price": {
+                "retail": product["price"]["retail"],
+                "wholesale": product["price"]["wholesale"],
+            },
+            "version": product.get("version", 0),
+        }
+
+    async def add_to_cart(self, session_key: str, slug: str, qty: int) -> bool:
+        product_id = await slug_index.resolve(slug)
+        if product_id is None:
+            return False
+
+        product = await products.find_one({"_id": product_id}, SNAPSHOT_FIELDS)
+        if product is None:
+            return False
+
+        key, items_key = self.cart_keys(session_key)
+        product_id = str(product["_id"])
+        snapshot = json.dumps(self.make_snapshot(product))
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zincrby(key, qty, product_id)
+            pipe.hset(items_key, product_id, snapshot)
+            await pipe.execute()
+
+        return True
+
+    async def add_many_to_cart(self, session_key: str, items: dict) -> list:
+        # всі товари одним запитом $in, всі зміни кошика одним конвеєром Redis
+        known = await slug_index.resolve_many(items)
+        if not known:
+            return []
+
+        slugs_by_id = {product_id: slug for slug, product_id in known.items()}
+        product_list = await products.find(
+            {"_id": {"$in": list(slugs_by_id)}}, SNAPSHOT_FIELDS
+        ).to_list(None)
+
+        if not product_list:
+            return []
+
+        key, items_key = self.cart_keys(session_key)
+        added = []
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for product in product_list:
+                slug = slugs_by_id[product["_id"]]
+                product_id = str(product["_id"])
+                snapshot = json.dumps(self.make_snapshot(product))
+                pipe.zincrby(key, items[slug], product_id)
+                pipe.hset(items_key, product_id, snapshot)
+                added.append(slug)
+            await pipe.execute()
+
+        return added
 
     async def clear_cart(self, session_key: str, specific: str = None):
-        key_to_delete = f"cart:{session_key}"
+        key, items_key = self.cart_keys(session_key)
 
         if specific:
-            product_document = await self.product_by_slug(specific)
-            self.redis.zrem(key_to_delete, str(product_document["_id"]))
+            product_id = await slug_index.resolve(specific)
+            if product_id is None:
+                return {"message": "product not found"}
+
+            product_id = str(product_id)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.zrem(key, product_id)
+                pipe.hdel(items_key, product_id)
+                await pipe.execute()
             return {"message": "product was delete"}
 
-        self.redis.delete(key_to_delete)
+        await self.redis.delete(key, items_key)
         return {"message": "cart was clear"}
 
-    async def retrieve_cart(self, session_key: str):
-        key = f"cart:{session_key}"
-        cart_items = self.redis.zrange(key, 0, -1, withscores=True)
+    async def retrieve_cart(self, session_key: str) -> list | None:
+        key, items_key = self.cart_keys(session_key)
+        items, raw_snapshots, versions = await self.read_cart(
+            keys=[key, items_key, PRODUCT_VERSIONS_KEY]
+        )
 
-        product_dict = {}
+        if not items:
+            return None
 
-        for item in cart_items:
-            product_dict.update({item[0].decode("utf-8"): {"qty": item[1]}})
+        snapshots = {
+            raw_snapshots[i].decode("utf-8"): json.loads(raw_snapshots[i + 1])
+            for i in range(0, len(raw_snapshots), 2)
+        }
 
-        products = await self.product_by_ids(list(product_dict.keys()))
+        cart_lines = {}
+        stale = []
 
-        if not products:
-            return None
+        for position in range(0, len(items), 2):
+            product_id = items[position].decode("utf-8")
+            qty = int(float(items[position + 1]))
+            version = versions[position // 2]
+            snapshot = snapshots.get(product_id)
+
+            # Mongo потрібна лише для товарів, які змінились після додавання,
+            # або якщо версії товару немає в Redis (наприклад, після очищення)
+            if (
+                snapshot is None
+                or version is None
+                or snapshot["version"] != int(version)
+            ):
+                stale.append(product_id)
+
+            cart_lines[product_id] = {**(snapshot or {}), "qty": qty}
+
+        if stale:
+            await self.__refresh_snapshots(session_key, stale, cart_lines)
+
+        return list(cart_lines.values()) or None
+
+    async def __refresh_snapshots(
+        self, session_key: str, stale: list, cart_lines: dict
+    ):
+        key, items_key = self.cart_keys(session_key)
+        fresh = await self.product_by_ids(stale, SNAPSHOT_FIELDS)
+        fresh = {str(product["_id"]): product for product in fresh}
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for product_id in stale:
+                product = fresh.get(product_id)
+
+                # товар видалено - прибираємо його з кошика
+                if product is None:
+                    cart_lines.pop(product_id)
+                    pipe.zrem(key, product_id)
+                    pipe.hdel(items_key, product_id)
+                    continue
+
+                snapshot = self.make_snapshot(product)
+                cart_lines[product_id].update(snapshot)
+                pipe.hset(items_key, product_id, json.dumps(snapshot))
+                # відновлює відсутню версію; наявну (можливо, новішу) не чіпає
+                pipe.hsetnx(PRODUCT_VERSIONS_KEY, product_id, snapshot["version"])
 
-        return {"products": products, "cart_data": product_dict}
+            await pipe.execute()
@@ -1,7 +1,11 @@
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
 
 from core.config import orderds
 from src.repositories.cart.repository import CartRepository
+from src.repositories.tools.pagination import decode_cursor, keyset_filter, paginate
+
+HISTORY_SORT = [("created_date", DESCENDING), ("_id", DESCENDING)]
 
 
 class OrderRepository(CartRepository):
@@ -11,10 +15,65 @@ class OrderRepository(CartRepository):
 
         return result
 
-    async def retrieve_all_orders(self, user_id: str = None):
-        if user_id:
-            return await orderds.find({}).sort({"created_date": -1}).to_list(None)
-        return await orderds.find({}).sort({"created_date": -1}).to_list(None)
+    async def retrieve_all_orders(
+        self, user_id: str, limit: int = 20, cursor: str = None, fields: list = None
+    ) -> tuple[list, str | None]:
+        # обслуговується індексом orders_user_history (user_id, created_date, _id)
+        filtering_data = {"user_id": user_id}
+
+        if cursor:
+            position = keyset_filter(
+                HISTORY_SORT, decode_cursor(cursor, len(HISTORY_SORT))
+            )
+            filtering_data = {"$and": [filtering_data, position]}
+
+        projection = self.summary_fields
+        if fields:
+            # created_date потрібна для курсора, після вибірки прибирається
+            projection = {
+                key: value
+                for key, value in projection.items()
+                if key in fields or key == "created_date"
+            }
+
+        order_list = (
+            await orderds.find(filtering_data, projection)
+            .sort(HISTORY_SORT)
+            .limit(limit + 1)
+            .to_list(None)
+        )
+        order_list, next_cursor = paginate(order_list, HISTORY_SORT, limit)
+
+        if fields and "created_date" not in fields:
+            for order in order_list:
+                order.pop("created_date")
+
+        return order_list, next_cursor
+
+    async def stream_orders(self, date_from=None, date_to=None, batch_size=500):
+        # курсор тримає в пам'яті лише одну партію документів
+        filtering_data = {}
+        if date_from:
+            filtering_data.setdefault("created_date", {})["$gte"] = date_from
+        if date_to:
+            filtering_data.setdefault("created_date", {})["$lt"] = date_to
+
+        cursor = (
+            orderds.find(filtering_data)
+            .sort("created_date", ASCENDING)
+            .batch_size(batch_size)
+        )
+        async for order in cursor:
+            yield order
+
+    @property
+    def summary_fields(self) -> dict:
+        return {
+            "status": 1,
+            "created_date": 1,
+            "total_price": 1,
+            "items": {"$size": "$items_line"},
+        }
 
     async def retrieve_order(self, order_id: str) -> dict:
         return await orderds.find_one({"_id": ObjectId(order_id)})
@@ -0,0 +1,47 @@
+import orjson
+
+from core import config
+from core.config import RedisTools
+from src.domain.tools.common import dumps
+
+
+class ProductCache:
+    def __init__(self, ttl: int) -> None:
+        self.redis = RedisTools().connect_redis
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(slug: str) -> str:
+        return f"product:detail:{slug}"
+
+    async def get(self, slug: str) -> dict | None:
+        cached = await self.redis.get(self.key(slug))
+
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return orjson.loads(cached)
+
+    async def set(self, slug: str, detail: dict):
+        await self.redis.set(self.key(slug), dumps(detail), self.ttl)
+
+    async def invalidate(self, *slugs: str):
+        keys = [self.key(slug) for slug in slugs if slug]
+        if keys:
+            await self.redis.delete(*keys)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0,
+            "ttl": self.ttl,
+        }
+
+
+product_cache = ProductCache(config.PRODUCT_CACHE_TTL)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from core import config
+from core.config import RedisTools, categories
+
+CATEGORIES_VERSION_KEY = "catalog:categories:version"
+
+
+class CategoryIndex:
+    # локальна копія колекції categories: створення товарів і фільтр за категорією
+    # не звертаються до Mongo. Лічильник версії в Redis перевіряється у фоні не
+    # частіше за check_interval; при зміні версії або після ttl колекція
+    # перечитується там же, а запити до того часу бачать попередній знімок
+    def __init__(self, check_interval: float, ttl: float) -> None:
+        self.redis = RedisTools().connect_redis
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.by_title: dict[str, dict] = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.loaded_at = None
+        self.task: asyncio.Task | None = None
+
+    async def resolve_many(self, titles) -> dict[str, dict]:
+        await self.refresh()
+        return {
+            title: self.by_title[title] for title in titles if title in self.by_title
+        }
+
+    async def titles(self) -> set[str]:
+        await self.refresh()
+        return set(self.by_title)
+
+    async def refresh(self, force: bool = False):
+        # чекати доводиться лише першого завантаження (або примусового)
+        if force or self.loaded_at is None:
+            await self.load()
+            return
+
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        if self.task is None or self.task.done():
+            self.checked_at = now
+            self.task = asyncio.create_task(self.check())
+
+    async def check(self):
+        version = await self.redis.get(CATEGORIES_VERSION_KEY)
+        expired = time.monotonic() - self.loaded_at >= self.ttl
+        if expired or version != self.version:
+            await self.load(version)
+
+    async def load(self, version: bytes = None):
+        if version is None:
+            version = await self.redis.get(CATEGORIES_VERSION_KEY)
+
+        category_list = await categories.find({}, {"title": 1}).to_list(None)
+        self.by_title = {category["title"]: category for category in category_list}
+        self.version = version
+        self.loaded_at = self.checked_at = time.monotonic()
+
+    async def bump(self):
+        # після зміни колекції categories: всі процеси перечитають її
+        await self.redis.incr(CATEGORIES_VERSION_KEY)
+        await self.refresh(force=True)
+
+
+category_index = CategoryIndex(
+    config.CATEGORY_CHECK_INTERVAL, config.CATEGORY_CACHE_TTL
+)
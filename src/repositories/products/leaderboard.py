@@ -0,0 +1,59 @@
+from bson import ObjectId
+
+from core.config import RedisTools
+
+RATING_LEADERBOARD_KEY = "leaderboard:rating"
+SOLD_LEADERBOARD_KEY = "leaderboard:sold"
+# змінюється разом з будь-якою множиною, входить в ETag списків з цих множин
+LEADERBOARD_VERSION_KEY = "leaderboard:version"
+
+LEADERBOARDS = {"rating": RATING_LEADERBOARD_KEY, "bestselling": SOLD_LEADERBOARD_KEY}
+
+
+class LeaderboardRepository:
+    # відсортовані множини _id товарів: середній рейтинг і кількість проданих одиниць.
+    # У leaderboard:rating є кожен товар (без оцінок - з нулем), тому порядок
+    # збігається з сортуванням rating, _id у Mongo
+    def __init__(self) -> None:
+        self.redis = RedisTools().connect_redis
+
+    async def add_products(self, product_ids: list[str]):
+        if not product_ids:
+            return
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(RATING_LEADERBOARD_KEY, dict.fromkeys(product_ids, 0), nx=True)
+            pipe.incr(LEADERBOARD_VERSION_KEY)
+            await pipe.execute()
+
+    async def set_ratings(self, ratings: dict):
+        if not ratings:
+            return
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(RATING_LEADERBOARD_KEY, ratings)
+            pipe.incr(LEADERBOARD_VERSION_KEY)
+            await pipe.execute()
+
+    async def add_sales(self, sold: dict):
+        if not sold:
+            return
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for product_id, qty in sold.items():
+                pipe.zincrby(SOLD_LEADERBOARD_KEY, qty, product_id)
+            pipe.incr(LEADERBOARD_VERSION_KEY)
+            await pipe.execute()
+
+    async def remove(self, product_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key in LEADERBOARDS.values():
+                pipe.zrem(key, product_id)
+            pipe.incr(LEADERBOARD_VERSION_KEY)
+            await pipe.execute()
+
+    async def top(self, board: str, offset: int, count: int) -> list[ObjectId]:
+        members = await self.redis.zrevrange(
+            LEADERBOARDS[board], offset, offset + count - 1
+        )
+        return [ObjectId(member.decode("utf-8")) for member in members]
@@ -0,0 +1,92 @@
+from dataclasses import dataclass, field
+
+from core.config import PRODUCT_INDEX_LEADS, PRODUCT_PRICE_FIELD, PRODUCT_SORT_ORDERS
+
+SORT_ORDERS = PRODUCT_SORT_ORDERS
+
+
+def index_name(sort: str, lead: str = None, price: bool = False) -> str:
+    # назви збігаються з індексами, які core.config.INDEXES будує з тих же ключів
+    if lead:
+        return f"products_{lead}_{sort}"
+    return f"products_{sort}_price" if price else f"products_{sort}"
+
+
+@dataclass
+class ProductQuery:
+    tags: list[str] = field(default_factory=list)
+    all_tags: bool = False
+    categories: list[str] = field(default_factory=list)
+    price_gt: int = None
+    price_lt: int = None
+    text: str = None
+    available: bool = True
+
+    @property
+    def narrowed(self) -> bool:
+        return bool(self.tags or self.categories or self.price_range or self.text)
+
+    @property
+    def lead(self) -> str | None:
+        if self.text:
+            return None
+        if self.tags:
+            return "tags"
+        if self.categories:
+            return "category"
+        return None
+
+    @property
+    def lead_field(self) -> str | None:
+        return PRODUCT_INDEX_LEADS.get(self.lead)
+
+    @property
+    def price_range(self) -> bool:
+        return self.price_gt is not None or self.price_lt is not None
+
+    def filter(self) -> dict:
+        # порядок полів і значень у списках фіксований, щоб однакові фільтри
+        # (?category=a&category=b і навпаки) давали однаковий запит і ключ кешу
+        f = {}
+        if self.tags:
+            tags = sorted(self.tags)
+            operator = "$all" if self.all_tags else "$in"
+            f["tags"] = tags[0] if len(tags) == 1 else {operator: tags}
+
+        if self.categories:
+            titles = sorted(self.categories)
+            f["category_ids.title"] = titles[0] if len(titles) == 1 else {"$in": titles}
+
+        price = {}
+        if self.price_gt is not None:
+            price["$gt"] = self.price_gt
+        if self.price_lt is not None:
+            price["$lt"] = self.price_lt
+        if price:
+            f[PRODUCT_PRICE_FIELD] = price
+
+        if self.available:
+            f["stock"] = {"$gt": 0}
+
+        if self.text:
+            f["$text"] = {"$search": self.text}
+
+        return f
+
+    def order(self, sort: str = None) -> str:
+        if sort == "relevance" and self.text:
+            return sort
+        return sort if sort in SORT_ORDERS else "newest"
+
+    def sort_keys(self, sort: str = None) -> list:
+        return SORT_ORDERS[self.order(sort)]
+
+    def hint(self, sort: str = None) -> str | None:
+        # з $text MongoDB сама обирає текстовий індекс, hint там заборонений
+        if self.text:
+            return None
+
+        order = self.order(sort)
+        # за sort=price діапазон ціни і так обмежує індекс сортування
+        price = self.price_range and SORT_ORDERS[order][0][0] != PRODUCT_PRICE_FIELD
+        return index_name(order, self.lead, price)
@@ -1,13 +1,66 @@
-from bson import ObjectId
-from fastapi import HTTPException
-from pymongo import ReturnDocument
-from pymongo.errors import DuplicateKeyError
-from redis import Redis
+import hashlib
+import uuid
+from datetime import datetime, timedelta
 
-from core.config import RedisTools, categories, comments, products
+import orjson
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+from pymongo import ASCENDING, DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from core import config
+from core.config import RedisTools, comments, products
+from src.domain.tools.common import dumps
+from src.repositories.products.cache import product_cache
+from src.repositories.products.categories import category_index
+from src.repositories.products.leaderboard import LeaderboardRepository
+from src.repositories.products.query import ProductQuery
+from src.repositories.products.slugs import SlugRepository
+from src.repositories.products.versions import CATALOG_VERSION_KEY, VersionRepository
+from src.repositories.tools.pagination import (
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    paginate,
+)
+
+PRICE_BUCKETS = [0, 100, 250, 500, 1000, 2500]
+LEASE_FIELDS = {"lease_until": "", "lease_owner": "", "lease_token": ""}
+
+
+def rating_update(score_delta: int, count_delta: int) -> list:
+    # оновлення-конвеєр: лічильники і середнє змінюються атомарно в одному документі
+    return [
+        {
+            "$set": {
+                "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, score_delta]},
+                "rating_count": {
+                    "$add": [{"$ifNull": ["$rating_count", 0]}, count_delta]
+                },
+            }
+        },
+        {
+            "$set": {
+                "rating": {
+                    "$cond": [
+                        {"$gt": ["$rating_count", 0]},
+                        {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 2]},
+                        0,
+                    ]
+                },
+                # рейтинг входить у сторінку товару, тому змінює і його версію
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+            }
+        },
+    ]
 
 
 class CommentRepository:
+    def __init__(self) -> None:
+        self.cache = product_cache
+        self.versions = VersionRepository()
+        self.leaderboard = LeaderboardRepository()
+
     async def create_comment(self, comment: dict):
         try:
             new = await comments.insert_one(comment)
@@ -23,84 +76,248 @@ class CommentRepository:
         except:
             return "error"
 
-    async def select_unmoder_comments(self):
-        return await comments.find({"moderate": 0}).to_list(None)
+    async def claim_unmoder_comments(
+        self, moderator: str, limit: int, lease_seconds: int
+    ) -> dict:
+        # кожен модератор отримує свою сторінку: коментарі з чужою активною
+        # орендою пропускаються, поки вона не закінчиться, а свої він бере
+        # повторно, тож оновлення сторінки повертає ті самі коментарі
+        now = datetime.now()
+        free = {
+            "moderate": 0,
+            "$or": [
+                {"lease_until": {"$not": {"$gt": now}}},
+                {"lease_owner": moderator},
+            ],
+        }
+
+        candidates = (
+            await comments.find(free, {"_id": 1})
+            .sort("created_at", ASCENDING)
+            .limit(limit)
+            .to_list(None)
+        )
+        if not candidates:
+            return {"comments": [], "lease_token": None, "lease_until": None}
+
+        ids = [comment["_id"] for comment in candidates]
+        token = uuid.uuid4().hex
+        lease_until = now + timedelta(seconds=lease_seconds)
+
+        # умова free повторюється, тому паралельний запит не перехопить оренду
+        await comments.update_many(
+            {**free, "_id": {"$in": ids}},
+            {
+                "$set": {
+                    "lease_until": lease_until,
+                    "lease_owner": moderator,
+                    "lease_token": token,
+                }
+            },
+        )
+
+        claimed = (
+            await comments.find({"_id": {"$in": ids}, "lease_token": token})
+            .sort("created_at", ASCENDING)
+            .to_list(None)
+        )
+        return {"comments": claimed, "lease_token": token, "lease_until": lease_until}
 
     async def update_comment(self, comment: ObjectId, result: str):
+        await self.moderate_comments({comment: result})
+
         if result == "approve":
-            await comments.find_one_and_update(
-                {"_id": comment}, {"$set": {"moderate": 1}}
-            )
             return {"message": "comment was approve"}
-        await comments.delete_one({"_id": comment})
         return {"message": "comment was delete"}
 
+    async def moderate_comments(self, decisions: dict[ObjectId, str]) -> dict:
+        # всі рішення одним bulk_write, рейтинги - одним bulk_write по товарах
+        projection = {"product": 1, "score": 1, "moderate": 1}
+        found = await comments.find(
+            {"_id": {"$in": list(decisions)}}, projection
+        ).to_list(None)
+
+        operations = []
+        # у кожного зачепленого товару змінюється версія, навіть з дельтою (0, 0)
+        deltas = {}
+        # рішення без коментаря, що чекає на нього, повертаються викликачу
+        missed = set(decisions) - {comment["_id"] for comment in found}
+
+        for comment in found:
+            approve = decisions[comment["_id"]] == "approve"
+            if approve and comment["moderate"] != 0:
+                missed.add(comment["_id"])
+                continue
+
+            # умова moderate не дає врахувати один коментар у рейтингу двічі
+            condition = {"_id": comment["_id"], "moderate": comment["moderate"]}
+            deltas.setdefault(comment["product"], (0, 0))
+
+            if approve:
+                update = {"$set": {"moderate": 1}, "$unset": LEASE_FIELDS}
+                operations.append(UpdateOne(condition, update))
+                delta = (comment["score"], 1)
+            else:
+                operations.append(DeleteOne(condition))
+                if comment["moderate"] != 1:
+                    continue
+                delta = (-comment["score"], -1)
+
+            score, count = deltas[comment["product"]]
+            deltas[comment["product"]] = (score + delta[0], count + delta[1])
+
+        missed = [comment_id for comment_id in decisions if comment_id in missed]
+        if not operations:
+            return {"approved": 0, "deleted": 0, "missed": missed}
+
+        result = await comments.bulk_write(operations, ordered=False)
+
+        if result.modified_count + result.deleted_count == len(operations):
+            await self.update_ratings(deltas)
+        else:
+            # частину рішень встиг застосувати інший модератор,
+            # тому рейтинг цих товарів перераховується з коментарів
+            await self.recount_ratings(list(deltas))
+
+        await self.cache.invalidate(*deltas)
+        return {
+            "approved": result.modified_count,
+            "deleted": result.deleted_count,
+            "missed": missed,
+        }
+
+    async def update_ratings(self, deltas: dict[str, tuple[int, int]]):
+        if not deltas:
+            return
+
+        # без зміни оцінок товар отримує лише нову версію: його коментарі змінились
+        await products.bulk_write(
+            [
+                UpdateOne(
+                    {"slug": slug},
+                    (
+                        rating_update(*delta)
+                        if delta != (0, 0)
+                        else {"$inc": {"version": 1}}
+                    ),
+                )
+                for slug, delta in deltas.items()
+            ],
+            ordered=False,
+        )
+        await self.publish_ratings(list(deltas))
+
+    async def recount_ratings(self, slugs: list[str]):
+        if not slugs:
+            return
+
+        pipeline = [
+            {"$match": {"product": {"$in": slugs}, "moderate": 1}},
+            {
+                "$group": {
+                    "_id": "$product",
+                    "sum": {"$sum": "$score"},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        totals = {slug: (0, 0) for slug in slugs}
+        async for aggregate in comments.aggregate(pipeline):
+            totals[aggregate["_id"]] = (aggregate["sum"], aggregate["count"])
+
+        reset = {"$set": {"rating_sum": 0, "rating_count": 0}}
+        await products.bulk_write(
+            [
+                UpdateOne({"slug": slug}, [reset, *rating_update(*total)])
+                for slug, total in totals.items()
+            ],
+            ordered=False,
+        )
+        await self.publish_ratings(slugs)
+
+    async def publish_ratings(self, slugs: list[str]):
+        # нові версії і рейтинги змінених товарів одним запитом
+        changed = await products.find(
+            {"slug": {"$in": slugs}}, {"version": 1, "rating": 1}
+        ).to_list(None)
+
+        await self.versions.bump_many(
+            {str(product["_id"]): product["version"] for product in changed}
+        )
+        await self.leaderboard.set_ratings(
+            {str(product["_id"]): product["rating"] for product in changed}
+        )
+
 
 class SearchProduct:
-    async def product_by_ids(self, ids: int | list):
+    async def product_by_ids(self, ids: int | list, projection: dict = None):
         if isinstance(ids, list):
             ids = list(map(lambda x: ObjectId(x), ids))
             product_list = await products.find(
-                {"_id": {"$in": ids}}, {"comments": 0}
+                {"_id": {"$in": ids}}, projection or {"comments": 0}
             ).to_list(None)
             return product_list
         return await products.find_one({"_id": ids})
 
-    async def product_by_slug(self, slug: str | set) -> list | dict:
+    async def product_by_slug(
+        self, slug: str | set, fields: list = None
+    ) -> list | dict:
 
         if isinstance(slug, set):
             list_of_slugs = list(map(lambda x: x.decode("utf-8"), slug))
             filter_data = {"slug": {"$in": list_of_slugs}}
+            projection = {"_id": 0, "comments": 0, **self.hidden_fields}
+            if fields:
+                projection = {"_id": 0, **{field: 1 for field in fields}}
             try:
-                return await products.find(
-                    filter_data, {"_id": 0, "comments": 0}
-                ).to_list(None)
+                return await products.find(filter_data, projection).to_list(None)
             except:
                 raise HTTPException(500, "something went wrong")
 
         detail_product = await products.find_one(
-            {"slug": slug}, {"_id": 0, "stock": 0, "available": 0, "created_at": 0}
+            {"slug": slug},
+            {
+                "_id": 0,
+                "stock": 0,
+                "available": 0,
+                "created_at": 0,
+                **self.hidden_fields,
+            },
         )
 
-        try:
-            detail_product["rating"] = self.__get_avg_rating(detail_product, self.redis)
-            return detail_product
-        except TypeError:
+        if detail_product is None:
             return None
 
-    async def category_by_title(self, title: list[str]) -> ObjectId | None:
-        return await categories.find({"title": {"$in": title}}).to_list(None)
+        detail_product.setdefault("rating", 0)
+        return detail_product
+
+    async def category_by_title(self, title: list[str]) -> list[dict]:
+        found = await category_index.resolve_many(title)
+        return list(found.values())
 
     async def get_comment_by_post(self, slug):
         filters = {"product": slug, "moderate": 1}
         list_of_comment = await comments.find(filters, {"_id": 0}).to_list(None)
         return list_of_comment
 
-    @classmethod
-    def __get_avg_rating(cls, product: dict, redis: Redis) -> float | int:
-        rating_key = f"rating:{product['slug']}"
-        if redis.get(rating_key) is None:
-
-            if product.get("comments") is None:
-                return 0
-
-            summary_score = 0
-
-            for comment in product["comments"]:
-                summary_score += comment["score"]
-
-            avg_rating = round(summary_score / len(product["comments"]), 2)
-
-            redis.set(rating_key, avg_rating, 86400)
-            return avg_rating
-
-        return redis.get(f"rating:{product['slug']}")
+    @property
+    def hidden_fields(self) -> dict:
+        # службові поля: версія йде в ETag, а не у відповідь
+        return {"search": 0, "rating_sum": 0, "rating_count": 0, "version": 0}
 
 
 class ProductRepository(SearchProduct):
+    # назви індексів, які реально існують у колекції; hint на відсутній індекс
+    # завершується OperationFailure, тому без нього запит іде через планувальник
+    indexes: set[str] = set()
+
     def __init__(self) -> None:
         client = RedisTools()
         self.redis = client.connect_redis
+        self.cache = product_cache
+        self.slugs = SlugRepository()
+        self.versions = VersionRepository()
+        self.leaderboard = LeaderboardRepository()
 
     async def create_product(self, data: dict) -> dict:
         category_ids = await self.category_by_title(data.pop("category_titles"))
@@ -113,29 +330,326 @@ class ProductRepository(SearchProduct):
         data["category_ids"] = cats
 
         try:
-            return await products.insert_one(data)
+            result = await products.insert_one(data)
         except DuplicateKeyError:
             raise HTTPException(400, {"error": "product with this slug already exists"})
 
-    async def select_product_list(self, filtering_data: dict, available: bool = True):
-        include = {"_id": 0, "comments": 0, "available": 0, "stock": 0}
-        if available:
-            filtering_data.update({"stock": {"$gt": 0}})
-        return (
-            await products.find(filtering_data, include)
-            .sort({"created_at": 1})
+        await self.slugs.add(data["slug"], str(result.inserted_id))
+        await self.leaderboard.add_products([str(result.inserted_id)])
+        await self.versions.bump()
+        return result
+
+    async def create_products(self, documents: list[dict]) -> tuple[dict, dict]:
+        # категорії пачки одним запитом, вставка без зупинки на першій помилці
+        titles = {title for data in documents for title in data["category_titles"]}
+        known = {
+            category["title"]: str(category["_id"])
+            for category in await self.category_by_title(list(titles))
+        }
+
+        failed = {}
+        to_insert = []
+        for position, data in enumerate(documents):
+            category_titles = data.pop("category_titles")
+            missing = [title for title in category_titles if title not in known]
+            if missing:
+                failed[position] = f"unknown categories: {', '.join(missing)}"
+                continue
+
+            data["category_ids"] = [
+                {"id": known[title], "title": title} for title in category_titles
+            ]
+            to_insert.append((position, data))
+
+        if to_insert:
+            try:
+                await products.insert_many(
+                    [data for _, data in to_insert], ordered=False
+                )
+            except BulkWriteError as error:
+                for write_error in error.details["writeErrors"]:
+                    position = to_insert[write_error["index"]][0]
+                    if write_error["code"] == 11000:
+                        failed[position] = "product with this slug already exists"
+                    else:
+                        failed[position] = write_error["errmsg"]
+
+        created = {
+            data["slug"]: str(data["_id"])
+            for position, data in to_insert
+            if position not in failed
+        }
+        if created:
+            await self.slugs.add_many(created)
+            await self.leaderboard.add_products(list(created.values()))
+            await self.versions.bump()
+
+        return created, failed
+
+    async def select_product_list(
+        self,
+        query: ProductQuery,
+        sort: str = "newest",
+        limit: int = 20,
+        cursor: str = None,
+        fields: list = None,
+    ) -> tuple[list, str | None]:
+        include = {"comments": 0, "available": 0, "stock": 0, **self.hidden_fields}
+        sort_keys = query.sort_keys(sort)
+
+        if fields:
+            # поля ключа сортування потрібні для курсора, після вибірки прибираються
+            include = {field: 1 for field in fields}
+            for field, _ in sort_keys:
+                if field.split(".")[0] not in include:
+                    include[field] = 1
+
+        # без фільтрів рейтинг береться з лідерборду, продажі - завжди з нього
+        if sort == "bestselling" or (sort == "rating" and not query.narrowed):
+            return await self.__select_from_leaderboard(
+                query, sort, include, limit, cursor, fields
+            )
+
+        if query.order(sort) == "relevance":
+            return await self.__select_by_relevance(
+                query.filter(), include, limit, cursor, fields
+            )
+
+        position = None
+        if cursor:
+            position = keyset_filter(sort_keys, decode_cursor(cursor, len(sort_keys)))
+
+        found = self.find_products(query, sort, include, position)
+        product_list = await found.limit(limit + 1).to_list(None)
+        product_list, next_cursor = paginate(product_list, sort_keys, limit)
+
+        for product in product_list:
+            product.pop("_id")
+            for key in product.keys() - set(fields or product):
+                product.pop(key)
+
+        return product_list, next_cursor
+
+    def find_products(
+        self,
+        query: ProductQuery,
+        sort: str = None,
+        projection: dict = None,
+        position: dict = None,
+    ):
+        # hint закріплює індекс під форму запиту, без вибору планувальника
+        filtering_data = query.filter()
+        if position:
+            filtering_data = {"$and": [filtering_data, position]}
+
+        found = products.find(filtering_data, projection).sort(query.sort_keys(sort))
+        hint = query.hint(sort)
+        return found.hint(hint) if hint in self.indexes else found
+
+    @classmethod
+    async def refresh_indexes(cls):
+        cls.indexes = set(await products.index_information())
+
+    @classmethod
+    async def __select_by_relevance(
+        cls,
+        filtering_data: dict,
+        include: dict,
+        limit: int,
+        cursor: str = None,
+        fields: list = None,
+    ) -> tuple[list, str | None]:
+        # textScore не можна використати в умові, тому курсор тут - це зсув
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(400, {"error": "invalid cursor"})
+
+        score = {"score": {"$meta": "textScore"}}
+        product_list = (
+            await products.find(filtering_data, {**include, **score})
+            .sort([("score", {"$meta": "textScore"}), ("_id", ASCENDING)])
+            .skip(offset)
+            .limit(limit + 1)
             .to_list(None)
         )
 
+        next_cursor = None
+        if len(product_list) > limit:
+            product_list = product_list[:limit]
+            next_cursor = encode_cursor([offset + limit])
+
+        for product in product_list:
+            product.pop("_id")
+            product.pop("score")
+            for key in product.keys() - set(fields or product):
+                product.pop(key)
+
+        return product_list, next_cursor
+
+    async def __select_from_leaderboard(
+        self,
+        query: ProductQuery,
+        board: str,
+        include: dict,
+        limit: int,
+        cursor: str = None,
+        fields: list = None,
+    ) -> tuple[list, str | None]:
+        # курсор - позиція в лідерборді; товари, що не пройшли фільтр
+        # (наприклад, закінчились), пропускаються, і читається наступна порція.
+        # Порцій на запит не більше LEADERBOARD_SCAN_ROUNDS: з вибірковим
+        # фільтром сторінка може бути неповною, а курсор веде далі по множині
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(400, {"error": "invalid cursor"})
+
+        filtering_data = query.filter()
+        product_list = []
+        next_cursor = None
+
+        for _ in range(config.LEADERBOARD_SCAN_ROUNDS):
+            ids = await self.leaderboard.top(board, offset, limit + 1)
+            if not ids:
+                break
+
+            found = await products.find(
+                {**filtering_data, "_id": {"$in": ids}}, include
+            ).to_list(None)
+            found = {product["_id"]: product for product in found}
+
+            for position, product_id in enumerate(ids, offset):
+                if product_id not in found:
+                    continue
+                if len(product_list) == limit:
+                    next_cursor = encode_cursor([position])
+                    break
+                product_list.append(found[product_id])
+
+            if next_cursor is not None or len(ids) <= limit:
+                break
+            offset += len(ids)
+        else:
+            next_cursor = encode_cursor([offset])
+
+        for product in product_list:
+            product.pop("_id")
+            for key in product.keys() - set(fields or product):
+                product.pop(key)
+
+        return product_list, next_cursor
+
+    async def facet_counts(self, filtering_data: dict) -> dict:
+        # кеш за нормалізованим фільтром, версія каталогу читається тим самим запитом
+        digest = hashlib.sha1(
+            json_util.dumps(filtering_data, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        key = f"facets:{digest}"
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(CATALOG_VERSION_KEY)
+            pipe.get(key)
+            version, cached = await pipe.execute()
+
+        version = int(version or 0)
+        if cached is not None:
+            cached = orjson.loads(cached)
+            if cached["version"] == version:
+                return cached["facets"]
+
+        facets = await self.__aggregate_facets(filtering_data)
+        payload = dumps({"version": version, "facets": facets})
+        await self.redis.set(key, payload, config.FACETS_CACHE_TTL)
+        return facets
+
+    @classmethod
+    async def __aggregate_facets(cls, filtering_data: dict) -> dict:
+        by_count = {"$sort": {"count": -1, "_id": 1}}
+        by_category = {"_id": "$category_ids.title", "count": {"$sum": 1}}
+        pipeline = [
+            {"$match": filtering_data},
+            {
+                "$facet": {
+                    "categories": [
+                        {"$unwind": "$category_ids"},
+                        {"$group": by_category},
+                        by_count,
+                    ],
+                    "tags": [
+                        {"$unwind": "$tags"},
+                        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                        by_count,
+                        {"$limit": 50},
+                    ],
+                    "price": [
+                        {
+                            "$bucket": {
+                                "groupBy": "$price.retail",
+                                "boundaries": [*PRICE_BUCKETS, float("inf")],
+                                "default": "unpriced",
+                                "output": {"count": {"$sum": 1}},
+                            }
+                        }
+                    ],
+                    "total": [{"$count": "count"}],
+                }
+            },
+        ]
+        result = (await products.aggregate(pipeline).to_list(None))[0]
+
+        # $bucket повертає лише нижню межу, верхня береться з PRICE_BUCKETS;
+        # останній діапазон відкритий (to = None), товари без ціни - окремо
+        upper = dict(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:]))
+        price = []
+        for bucket in result["price"]:
+            lower = None if bucket["_id"] == "unpriced" else bucket["_id"]
+            price.append(
+                {"from": lower, "to": upper.get(lower), "count": bucket["count"]}
+            )
+
+        return {
+            "categories": [
+                {"title": item["_id"], "count": item["count"]}
+                for item in result["categories"]
+            ],
+            "tags": [
+                {"title": item["_id"], "count": item["count"]}
+                for item in result["tags"]
+            ],
+            "price": price,
+            "total": result["total"][0]["count"] if result["total"] else 0,
+        }
+
     async def update_product(self, slug: str, updated_data: dict):
+        # кожна зміна товару збільшує version, кошики по ній бачать застарілі знімки
+        updated_data.setdefault("$inc", {})["version"] = 1
         updated_product = await products.find_one_and_update(
             {"slug": slug},
             updated_data,
-            projection={"_id": 0, "title": 1, "description": 1},
+            projection={"_id": 1, "title": 1, "description": 1, "version": 1},
             return_document=ReturnDocument.AFTER,
         )
 
+        new_slug = updated_data["$set"].get("slug")
+        await self.cache.invalidate(slug, new_slug)
+
+        if updated_product is None:
+            return None
+
+        product_id = str(updated_product.pop("_id"))
+        await self.versions.bump(product_id, updated_product.pop("version"))
+
+        if new_slug and new_slug != slug:
+            await self.slugs.rename(slug, new_slug, product_id)
+
         return updated_product
 
     async def delete_product(self, slug: str):
-        return await products.delete_one({"slug": slug})
+        deleted = await products.find_one_and_delete({"slug": slug}, {"_id": 1})
+        await self.cache.invalidate(slug)
+
+        if deleted is not None:
+            await self.versions.bump(str(deleted["_id"]), -1)
+            await self.slugs.remove(slug)
+            await self.leaderboard.remove(str(deleted["_id"]))
+
+        return deleted
@@ -0,0 +1,197 @@
+import asyncio
+import contextlib
+import time
+
+import orjson
+from bson import ObjectId
+
+from core import config
+from core.config import RedisTools, products
+
+SLUGS_KEY = "catalog:slugs"
+SLUGS_READY_KEY = "catalog:slugs:ready"
+SLUGS_VERSION_KEY = "catalog:slugs:version"
+# повідомлення про зміни індексу: {"version": n, "set": {...}, "remove": [...]}
+# або {"version": n, "resync": true} після повної перебудови
+SLUGS_CHANNEL = "catalog:slugs:changes"
+
+
+class SlugRepository:
+    # легкий індекс slug -> _id у Redis, щоб перевіряти існування товару без Mongo
+    def __init__(self) -> None:
+        self.redis = RedisTools().connect_redis
+
+    async def rebuild(self, batch_size: int = 1000):
+        # індекс будується в тимчасовому ключі і підміняється атомарно через RENAME
+        tmp_key = f"{SLUGS_KEY}:tmp"
+        await self.redis.delete(tmp_key)
+
+        mapping = {}
+        async for product in products.find({}, {"slug": 1}).batch_size(batch_size):
+            mapping[product["slug"]] = str(product["_id"])
+
+            if len(mapping) == batch_size:
+                await self.redis.hset(tmp_key, mapping=mapping)
+                mapping = {}
+
+        if mapping:
+            await self.redis.hset(tmp_key, mapping=mapping)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if await self.redis.exists(tmp_key):
+                pipe.rename(tmp_key, SLUGS_KEY)
+            else:
+                pipe.delete(SLUGS_KEY)
+            pipe.set(SLUGS_READY_KEY, 1)
+            pipe.incr(SLUGS_VERSION_KEY)
+            *_, version = await pipe.execute()
+
+        await self.publish({"version": version, "resync": True})
+
+    async def add(self, slug: str, product_id: str):
+        await self.add_many({slug: product_id})
+
+    async def add_many(self, mapping: dict):
+        if not mapping:
+            return
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(SLUGS_KEY, mapping=mapping)
+            pipe.incr(SLUGS_VERSION_KEY)
+            _, version = await pipe.execute()
+        for slug, product_id in mapping.items():
+            slug_index.set(slug, product_id)
+
+        await self.publish({"version": version, "set": mapping})
+
+    async def rename(self, old_slug: str, new_slug: str, product_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(SLUGS_KEY, old_slug)
+            pipe.hset(SLUGS_KEY, new_slug, product_id)
+            pipe.incr(SLUGS_VERSION_KEY)
+            *_, version = await pipe.execute()
+        slug_index.discard(old_slug)
+        slug_index.set(new_slug, product_id)
+
+        change = {"version": version, "set": {new_slug: product_id}}
+        await self.publish({**change, "remove": [old_slug]})
+
+    async def remove(self, slug: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(SLUGS_KEY, slug)
+            pipe.incr(SLUGS_VERSION_KEY)
+            _, version = await pipe.execute()
+        slug_index.discard(slug)
+
+        await self.publish({"version": version, "remove": [slug]})
+
+    async def publish(self, change: dict):
+        await self.redis.publish(SLUGS_CHANNEL, orjson.dumps(change))
+
+
+class SlugIndex:
+    # локальна копія catalog:slugs у пам'яті процесу: перевірка існування товару
+    # і slug -> _id без запитів до бази. Зміни з інших процесів приходять
+    # повідомленнями SLUGS_CHANNEL і застосовуються по одному запису; повне
+    # читання хеша лише на старті, після перебудови або при пропущеній версії.
+    # Лічильник версії додатково перевіряється не частіше за check_interval на
+    # випадок, якщо повідомлення загубились (наприклад, при перепідключенні)
+    def __init__(self, check_interval: float) -> None:
+        self.redis = RedisTools().connect_redis
+        self.check_interval = check_interval
+        self.ids: dict[str, ObjectId] = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.behind = None
+        self.listener: asyncio.Task | None = None
+
+    async def resolve(self, slug: str) -> ObjectId | None:
+        await self.refresh()
+        return self.ids.get(slug)
+
+    async def resolve_many(self, slugs) -> dict[str, ObjectId]:
+        await self.refresh()
+        return {slug: self.ids[slug] for slug in slugs if slug in self.ids}
+
+    async def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+
+        if self.listener is not None and self.listener.done():
+            # підписка обірвалась, повідомлення могли загубитись
+            self.subscribe()
+            force = True
+
+        version = await self.redis.get(SLUGS_VERSION_KEY)
+        if version is None or not await self.redis.exists(SLUGS_READY_KEY):
+            await SlugRepository().rebuild()
+        elif force or self.version is None:
+            pass
+        elif int(version) <= self.version:
+            self.behind = None
+            return
+        elif self.behind is None or self.version >= self.behind:
+            # версія могла випередити ще не доставлене повідомлення,
+            # тому повне читання - лише якщо відставання триває до наступної перевірки
+            self.behind = int(version)
+            return
+
+        await self.reload()
+
+    async def reload(self):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(SLUGS_VERSION_KEY)
+            pipe.hgetall(SLUGS_KEY)
+            version, mapping = await pipe.execute()
+
+        self.version = int(version or 0)
+        self.behind = None
+        self.ids = {
+            slug.decode("utf-8"): ObjectId(product_id.decode("utf-8"))
+            for slug, product_id in mapping.items()
+        }
+
+    def apply(self, change: dict) -> bool:
+        # False - версія пропущена, потрібне повне читання
+        if self.version is not None and change["version"] <= self.version:
+            return True
+        if change.get("resync") or change["version"] != (self.version or 0) + 1:
+            return False
+
+        for slug in change.get("remove", []):
+            self.discard(slug)
+        for slug, product_id in change.get("set", {}).items():
+            self.set(slug, product_id)
+        self.version = change["version"]
+        return True
+
+    def subscribe(self):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+
+    async def unsubscribe(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.listener
+            self.listener = None
+
+    async def listen(self):
+        async with self.redis.pubsub() as pubsub:
+            await pubsub.subscribe(SLUGS_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                if not self.apply(orjson.loads(message["data"])):
+                    await self.reload()
+
+    def set(self, slug: str, product_id: str):
+        self.ids[slug] = ObjectId(product_id)
+
+    def discard(self, slug: str):
+        self.ids.pop(slug, None)
+
+
+slug_index = SlugIndex(config.SLUG_INDEX_CHECK_INTERVAL)
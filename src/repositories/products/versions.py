@@ -0,0 +1,34 @@
+from core.config import RedisTools
+
+CATALOG_VERSION_KEY = "catalog:version"
+PRODUCT_VERSIONS_KEY = "product:version"
+
+
+class VersionRepository:
+    # catalog:version змінюється при будь-якому записі в каталог,
+    # product:version дзеркалить поле version документа товару
+    def __init__(self) -> None:
+        self.redis = RedisTools().connect_redis
+
+    async def catalog(self) -> int:
+        return int(await self.redis.get(CATALOG_VERSION_KEY) or 0)
+
+    async def counters(self, *keys: str) -> list[int]:
+        return [int(value or 0) for value in await self.redis.mget(keys)]
+
+    async def product(self, product_id: str) -> int:
+        return int(await self.redis.hget(PRODUCT_VERSIONS_KEY, product_id) or 0)
+
+    async def bump(self, product_id: str = None, version: int = None):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(CATALOG_VERSION_KEY)
+            if product_id is not None:
+                pipe.hset(PRODUCT_VERSIONS_KEY, product_id, version)
+            await pipe.execute()
+
+    async def bump_many(self, versions: dict):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(CATALOG_VERSION_KEY)
+            if versions:
+                pipe.hset(PRODUCT_VERSIONS_KEY, mapping=versions)
+            await pipe.execute()
@@ -0,0 +1,62 @@
+import base64
+import binascii
+
+from bson import json_util
+from fastapi import HTTPException
+
+
+def encode_cursor(values: list) -> str:
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(400, {"error": "invalid cursor"})
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(400, {"error": "invalid cursor"})
+
+    return values
+
+
+def keyset_filter(sort: list[tuple[str, int]], values: list) -> dict:
+    # для сортування (a, b) умова "після курсора": a > x або (a == x і b > y).
+    # null (або відсутнє поле) MongoDB ставить перед усіма значеннями, тож за
+    # зростанням після null іде будь-яке не-null значення, а за спаданням
+    # після null лишаються тільки інші null, які розрізняє наступне поле
+    clauses = []
+    for position, (field, direction) in enumerate(sort):
+        value = values[position]
+        if direction == 1:
+            condition = {"$ne": None} if value is None else {"$gt": value}
+        elif value is None:
+            continue
+        else:
+            condition = {"$not": {"$gte": value}}
+
+        clause = {prev: equal for (prev, _), equal in zip(sort, values[:position])}
+        clause[field] = condition
+        clauses.append(clause)
+
+    return {"$or": clauses}
+
+
+def get_path(document: dict, path: str):
+    for key in path.split("."):
+        document = document.get(key) if isinstance(document, dict) else None
+    return document
+
+
+def paginate(
+    documents: list, sort: list[tuple[str, int]], limit: int
+) -> tuple[list, str | None]:
+    # документи вибираються з limit + 1, зайвий означає наявність наступної сторінки
+    if len(documents) <= limit:
+        return documents, None
+
+    documents = documents[:limit]
+    last = documents[-1]
+    return documents, encode_cursor([get_path(last, field) for field, _ in sort])
@@ -1,30 +1,50 @@
 from core.config import RedisTools
 from src.repositories.products.repository import ProductRepository
+from src.repositories.products.slugs import SLUGS_KEY, SLUGS_READY_KEY, SlugRepository
+
+# перевірка товару і перемикання закладки атомарно, за один запит до Redis
+TOGGLE_BOOKMARK_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return -1
+end
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 then
+    return -2
+end
+if redis.call('SREM', KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+return 1
+"""
 
 
 class RedisRepository:
     def __init__(self) -> None:
         self.__redis = RedisTools().connect_redis
+        self.__toggle = self.__redis.register_script(TOGGLE_BOOKMARK_SCRIPT)
         self.repo = ProductRepository()
+        self.slugs = SlugRepository()
 
     async def update_bookmark(self, session_key: str, product_slug):
-        set_key = f"bookmark:{session_key}"
+        keys = [f"bookmark:{session_key}", SLUGS_KEY, SLUGS_READY_KEY]
 
-        product_exists = await self.repo.product_by_slug(product_slug)
-        if product_exists is None:
-            return {"code": "404", "error": "product doesnt exists"}
+        result = await self.__toggle(keys=keys, args=[product_slug])
 
-        if self.__redis.sismember(set_key, product_slug) == 1:
+        # індекс slug ще не побудований
+        if result == -1:
+            await self.slugs.rebuild()
+            result = await self.__toggle(keys=keys, args=[product_slug])
+
+        if result == -2:
+            return {"code": "404", "error": "product doesnt exists"}
 
-            self.__redis.srem(set_key, product_slug)
+        if result == 0:
             return {"code": 200, "message": "delete from bookmark"}
 
-        else:
-            self.__redis.sadd(set_key, product_slug)
-            return {"code": 204, "message": "add complete"}
+        return {"code": 204, "message": "add complete"}
 
-    async def get_bookmarks(self, session_key):
+    async def get_bookmarks(self, session_key, fields: list = None):
         set_key = f"bookmark:{session_key}"
-        members = self.__redis.smembers(set_key)
+        members = await self.__redis.smembers(set_key)
 
-        return await self.repo.product_by_slug(members)
+        return await self.repo.product_by_slug(members, fields)
@@ -17,22 +17,10 @@ class UserRepository:
             )
 
     async def get_users(self):
-        result = await users.find({}).to_list(20)
-
-        res = []
-
-        for k, v in result.items():
-            if k == "_id":
-                res.append({k: (str(v))})
-            else:
-                res.append({k: v})
-        return res
+        return await users.find({}, {"hash_password": 0}).to_list(20)
 
     async def get_user_by_id(self, user_id: ObjectId):
-        result = await users.find_one({"_id": user_id}, {"hash_password": 0})
-
-        result["_id"] = str(result.pop("_id"))
-        return result
+        return await users.find_one({"_id": user_id}, {"hash_password": 0})
 
     async def get_user_by_email(self, email) -> dict:
         user = await users.find_one({"email": email})
@@ -11,7 +11,7 @@ from main import app
 async def clear_fake_data():
     print("start")
     yield
-    redis_client.delete("bookmark:fakecookie")
+    await redis_client.delete("bookmark:fakecookie")
 
 
 @pytest.fixture(scope="session")
@@ -0,0 +1,28 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_add_many_to_cart(aclient: AsyncClient):
+    await aclient.post("/cart/")
+
+    response = await aclient.post(
+        "/cart/items",
+        json=[
+            {"slug": "test-dlia-seleri5", "qty": 2},
+            {"slug": "test-dlia-seleri5", "qty": 1},
+            {"slug": "testovii-tovar", "qty": 1},
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json()["added"] == ["test-dlia-seleri5"]
+    assert response.json()["errors"] == [
+        {"slug": "testovii-tovar", "error": "product not found"}
+    ]
+
+    cart = (await aclient.get("/cart/")).json()
+    assert cart[0]["slug"] == "test-dlia-seleri5"
+    assert cart[0]["qty"] == 3
+    assert cart[-1]["summary"] == cart[0]["total"]
+
+    await aclient.post("/cart/")
@@ -0,0 +1,49 @@
+import json
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from core.liqpay import LiqPay
+
+
+def liqpay_stub(request: httpx.Request) -> httpx.Response:
+    form = {k: v[0] for k, v in parse_qs(request.content.decode("utf-8")).items()}
+
+    if request.url.path == "/api/3/checkout/":
+        return httpx.Response(302, headers={"location": "/pay/checkout-id"})
+
+    if request.url.path == "/pay/checkout-id":
+        return httpx.Response(200)
+
+    expected = LiqPay("public", "private")._make_signature("private", form["data"])
+    if form["signature"] != expected:
+        return httpx.Response(200, json={"status": "error"})
+
+    return httpx.Response(200, json={"status": "success", **json.loads(form["data"])})
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_liqpay_api_signature():
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(liqpay_stub), follow_redirects=True
+    ) as client:
+        liqpay = LiqPay("public", "private", client=client)
+        response = await liqpay.api(
+            "request", {"version": "3", "action": "status", "order_id": "1"}
+        )
+
+    assert response["status"] == "success"
+    assert response["public_key"] == "public"
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_liqpay_checkout_redirect():
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(liqpay_stub), follow_redirects=True
+    ) as client:
+        liqpay = LiqPay("public", "private", client=client)
+        response = await liqpay.post("3/checkout/", {"data": "", "signature": ""})
+
+    assert response.status_code == 200
+    assert str(response.url) == "https://www.liqpay.ua/pay/checkout-id"
@@ -0,0 +1,64 @@
+import pytest
+from bson import json_util
+from pymongo import UpdateOne
+
+from core import celery
+from core.celery import MaintenanceJob
+from core.config import sync_db
+
+
+class FakeRedis:
+    # лише те, що run_in_batches робить з контрольною точкою
+    def __init__(self) -> None:
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def mark_done(document: dict) -> UpdateOne:
+    return UpdateOne({"_id": document["_id"]}, {"$set": {"done": True}})
+
+
+def test_maintenance_job_resumes_from_checkpoint(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(celery, "sync_redis_client", redis)
+
+    collection = sync_db["test_maintenance"]
+    collection.drop()
+    ids = collection.insert_many([{"done": False} for _ in range(5)]).inserted_ids
+
+    job = MaintenanceJob()
+    job.name = "tests.maintenance"
+    calls = []
+
+    def interrupt(documents):
+        calls.append(documents)
+        if len(calls) == 2:
+            raise RuntimeError("worker lost")
+
+    try:
+        with pytest.raises(RuntimeError):
+            job.run_in_batches("test_maintenance", {}, mark_done, None, 2, 0, interrupt)
+
+        # позиція збережена після першої завершеної пачки
+        assert json_util.loads(redis.get(job.checkpoint_key)) == ids[1]
+
+        seen = []
+        result = job.run_in_batches(
+            "test_maintenance", {}, mark_done, None, 2, 0, seen.extend
+        )
+        assert [document["_id"] for document in seen] == ids[2:]
+        assert result["processed"] == 3
+        assert collection.count_documents({"done": False}) == 0
+
+        # після повного проходу контрольна точка прибирається
+        assert job.checkpoint_key not in redis.data
+    finally:
+        collection.drop()